@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Importing Order and OrderLineItems models
-from .models import Order, OrderLineItem
+from .models import Order, OrderLineItem, WebhookEvent
 
 
 class OrderLineItemAdminInline(admin.TabularInline):
@@ -48,3 +48,19 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Order, OrderAdmin)
+
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    """
+    Showing the saved Stripe webhook events, so failed events can be
+    found and set back to pending to be tried again
+    """
+    readonly_fields = ('event_id', 'event_type', 'payload', 'attempts',
+                       'last_error', 'date_received', 'date_processed')
+    list_display = ('event_id', 'event_type', 'status', 'attempts',
+                    'date_received', 'date_processed')
+    list_filter = ('status', 'event_type')
+    ordering = ('-date_received',)
+
+
+admin.site.register(WebhookEvent, WebhookEventAdmin)
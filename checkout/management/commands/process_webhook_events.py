@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from checkout.models import WebhookEvent
+from checkout.webhook_events import claim_events, process_event
+
+
+class Command(BaseCommand):
+    """
+    Handles the Stripe webhook events saved by the webhook view. Events
+    are claimed in batches and handled by a pool of worker threads, so a
+    slow event does not hold up the others. Several copies of the
+    command can run at once, as each event can only be claimed by one of
+    them. Events that have already been handled are never claimed again,
+    and an event whose claim ends before it is handled is left for the
+    worker that claims it next.
+    Runs until stopped, or until no events are waiting with --once.
+    """
+    help = 'Handle the saved Stripe webhook events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of events handled at the same time')
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Number of events claimed at a time')
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=settings.WEBHOOK_MAX_ATTEMPTS,
+            help='Number of times an event is tried before it fails')
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Number of seconds to wait when no events are waiting')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Stop once no events are waiting')
+
+    def handle(self, *args, **options):
+        self.max_attempts = options['max_attempts']
+        self.counts = dict.fromkeys(
+            [WebhookEvent.DONE, WebhookEvent.PENDING, WebhookEvent.FAILED,
+             None], 0)
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                events = claim_events(options['batch_size'])
+                if not events:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                for status in pool.map(self._process, events):
+                    self.counts[status] += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Handled {self.counts[WebhookEvent.DONE]} events, '
+            f'{self.counts[WebhookEvent.PENDING]} will be tried again and '
+            f'{self.counts[WebhookEvent.FAILED]} failed, '
+            f'{self.counts[None]} were left after their claim ended'))
+
+    def _process(self, webhook_event):
+        # Each thread has its own database connection, which is closed
+        # once the event is handled
+        try:
+            status = process_event(webhook_event, self.max_attempts)
+        finally:
+            connections.close_all()
+        if status is None:
+            self.stderr.write(
+                f'Event {webhook_event.event_id} was left after its '
+                'claim ended')
+        elif status != WebhookEvent.DONE:
+            self.stderr.write(
+                f'Event {webhook_event.event_id} is {status}')
+        return status
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def rename_duplicate_stripe_pids(apps, schema_editor):
+    """
+    Orders created twice for the same payment intent, by the checkout
+    view and the webhook, are kept but every order after the first has
+    its order id added to its payment intent id so the ids are unique
+    """
+    Order = apps.get_model('checkout', 'Order')
+    duplicates = Order.objects.exclude(stripe_pid='').values(
+        'stripe_pid').annotate(count=models.Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        orders = Order.objects.filter(
+            stripe_pid=duplicate['stripe_pid']).order_by('date', 'id')
+        for order in orders[1:]:
+            order.stripe_pid = f'{order.stripe_pid}-duplicate-{order.id}'
+            order.save(update_fields=['stripe_pid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_order_user_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            rename_duplicate_stripe_pids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('stripe_pid', ''), _negated=True),
+                fields=('stripe_pid',), name='unique_order_stripe_pid'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.4 on 2026-10-17 10:52
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0005_unique_order_stripe_pid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                 primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=255)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[
+                    ('pending', 'Pending'), ('processing', 'Processing'),
+                    ('done', 'Done'), ('failed', 'Failed')],
+                    default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(
+                    default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date_received', models.DateTimeField(auto_now_add=True)),
+                ('date_processed', models.DateTimeField(
+                    blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(
+                fields=['status', 'available_at'],
+                name='webhook_event_status_idx'),
+        ),
+    ]
@@ -1,9 +1,10 @@
 # Used to generate the order number
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from django.conf import settings
+from django.utils import timezone
 
 # Importing country fields for the stripe country dropdown
 from django_countries.fields import CountryField
@@ -56,6 +57,16 @@ class Order(models.Model):
     stripe_pid = models.CharField(
         max_length=254, null=False, blank=False, default='')
 
+    class Meta:
+        constraints = [
+            # Each payment intent has only one order, so the checkout view
+            # and the webhook cannot both create one. The unique index is
+            # also used to find the order of a payment intent.
+            models.UniqueConstraint(
+                fields=['stripe_pid'], condition=~models.Q(stripe_pid=''),
+                name='unique_order_stripe_pid'),
+        ]
+
     def _generate_order_number(self):
         """
         The code within this private method will generate a random,
@@ -88,7 +99,31 @@ class Order(models.Model):
         else:
             self.delivery_cost = 0
         self.final_total = self.order_total + self.delivery_cost
-        self.save()
+        # Only the totals are saved, the rest of the order is unchanged
+        self.save(update_fields=[
+            'order_total', 'delivery_cost', 'final_total'])
+
+    def add_line_items(self, lines):
+        """
+        Creating every line item of the order at once, lines is a list of
+        (product, quantity, size) for each line. The line items are saved
+        with a single bulk_create in one transaction, which does not send
+        the line item signals, so the order total is worked out once at the
+        end instead of once for each line. Line items added or edited one
+        at a time, such as in the admin, still update the total with the
+        signals.
+        """
+        line_items = [
+            OrderLineItem(
+                order=self, product=product, quantity=quantity,
+                product_size=size)
+            for product, quantity, size in lines]
+        for line_item in line_items:
+            line_item.set_lineitem_total()
+        with transaction.atomic():
+            OrderLineItem.objects.bulk_create(line_items)
+            self.update_total()
+        return line_items
 
     # String method returning the order number
     def __str__(self):
@@ -115,15 +150,64 @@ class OrderLineItem(models.Model):
         max_digits=6, decimal_places=2, null=False, blank=False,
         editable=False)
 
+    def set_lineitem_total(self):
+        """Setting the lineitem total from the product price and quantity"""
+        self.lineitem_total = self.product.product_price * self.quantity
+
     def save(self, *args, **kwargs):
         """
         This code within the save method will, override the original save
         method to set the lineitem total and update the order total by
         multiplying the product price and quantity of each line item.
         """
-        self.lineitem_total = self.product.product_price * self.quantity
+        self.set_lineitem_total()
         super().save(*args, **kwargs)
 
     # String method returning the product sku and order number
     def __str__(self):
         return f'SKU {self.product.sku} on order {self.order.order_number}'
+
+
+class WebhookEvent(models.Model):
+    """
+    A Stripe webhook event saved by the webhook view to be handled later
+    by the process_webhook_events command. The webhook view only checks
+    the signature and saves the event, so Stripe gets its reply straight
+    away. The event id is unique, so an event Stripe sends again is only
+    saved and handled once.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=255)
+    # The event exactly as Stripe sent it
+    payload = models.TextField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the event can next be picked up, pushed back while a worker
+    # is handling it and after each failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    date_received = models.DateTimeField(auto_now_add=True)
+    date_processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Used by the workers to find the events waiting to be handled
+            models.Index(
+                fields=['status', 'available_at'],
+                name='webhook_event_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} {self.event_id}'
@@ -0,0 +1,62 @@
+"""
+Building an order and its line items from a shopping trolley.
+
+Used by both the checkout view and the Stripe webhook, so an order is
+always built the same way whichever of them gets there first. Every
+product in the trolley is looked up before anything is written, in a
+single query for any products not already kept in memory, and the order
+and all of its line items are then saved in one transaction. If any
+part fails nothing is saved, so there is no half built order to delete.
+
+The checkout view and the webhook can both try to build the order of a
+payment at the same time. Only one order can be saved for each payment
+intent id, so whichever of them saves second uses the order saved first.
+"""
+from django.db import IntegrityError, transaction
+
+from .models import Order
+
+
+class MissingProductError(Exception):
+    """Raised when a product in the trolley no longer exists"""
+
+    def __init__(self, product_id):
+        super().__init__(f'Product {product_id} does not exist')
+        self.product_id = product_id
+
+
+def build_order(order, trolley):
+    """
+    Saving the unsaved order and a line item for each line in the
+    trolley, raising MissingProductError before anything is saved if a
+    product in the trolley has been deleted
+    """
+    products = trolley.products()
+    lines = []
+    for product_id, size, quantity in trolley:
+        product = products.get(product_id)
+        if product is None:
+            raise MissingProductError(product_id)
+        lines.append((product, quantity, size))
+
+    with transaction.atomic():
+        order.save()
+        order.add_line_items(lines)
+    return order
+
+
+def get_or_build_order(order, trolley):
+    """
+    Returning the order already saved for the payment intent of the
+    unsaved order, or building the order from the trolley if there is
+    none yet. Returns the order and whether it was built.
+    """
+    existing = Order.objects.filter(stripe_pid=order.stripe_pid).first()
+    if existing is not None:
+        return existing, False
+    try:
+        return build_order(order, trolley), True
+    except IntegrityError:
+        # The order of the payment intent was saved by another request
+        # after it was looked for above
+        return Order.objects.get(stripe_pid=order.stripe_pid), False
@@ -0,0 +1,101 @@
+"""
+The Stripe payment intent of the checkout page, kept in the session.
+
+Each visit to the checkout page used to create a new payment intent, so
+refreshing the page or coming back to it cost a call to Stripe and left
+the earlier intent unused. The intent id and client secret are now kept
+in the session along with a hash of the trolley and the amount, and
+the same intent is used until the order is placed, so loading the page
+again with the same trolley does not call Stripe at all. If the trolley
+has changed the intent is updated in place with the new amount and
+trolley, instead of creating a new one. An intent that has already been
+paid or cancelled is never handed out again, a new one is created
+instead. A paid intent is found from its order, or from its Stripe
+payment event waiting to be handled, without asking Stripe.
+"""
+from django.conf import settings
+
+import stripe
+
+from .models import Order, WebhookEvent
+
+PAYMENT_INTENT_KEY = 'payment_intent'
+
+# Statuses of an intent that can still be paid by the checkout page
+PAYABLE_STATUSES = [
+    'requires_payment_method', 'requires_confirmation', 'requires_action']
+
+
+def is_paid(pid):
+    """
+    Whether the payment intent has been paid, going by the order saved
+    for it or the payment event Stripe sent for it. Events that have
+    been handled saved their order, so only the others are searched.
+    """
+    if Order.objects.filter(stripe_pid=pid).exists():
+        return True
+    return WebhookEvent.objects.filter(
+        status__in=[
+            WebhookEvent.PENDING, WebhookEvent.PROCESSING,
+            WebhookEvent.FAILED],
+        event_type='payment_intent.succeeded',
+        payload__contains=f'"{pid}"').exists()
+
+
+def get_payment_intent(request, trolley, amount):
+    """
+    Returning the client secret of the session's payment intent for the
+    trolley and amount in pence, updating the intent if the trolley has
+    changed and creating one if there is no intent that can be paid
+    """
+    stored = request.session.get(PAYMENT_INTENT_KEY)
+    trolley_hash = trolley.content_hash()
+    if stored and is_paid(stored['id']):
+        stored = None
+    if (stored and stored['amount'] == amount
+            and stored['trolley_hash'] == trolley_hash):
+        return stored['client_secret']
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    intent = None
+    if stored:
+        try:
+            intent = stripe.PaymentIntent.modify(
+                stored['id'], amount=amount,
+                metadata={'trolley': trolley.to_json()})
+        # An intent that has been paid or cancelled cannot be changed,
+        # so a new one is created instead
+        except stripe.error.InvalidRequestError:
+            pass
+    if intent is not None and intent.status not in PAYABLE_STATUSES:
+        intent = None
+    if intent is None:
+        intent = stripe.PaymentIntent.create(
+            amount=amount,
+            currency=settings.STRIPE_CURRENCY,
+            metadata={'trolley': trolley.to_json()},
+        )
+    request.session[PAYMENT_INTENT_KEY] = {
+        'id': intent.id,
+        'client_secret': intent.client_secret,
+        'trolley_hash': trolley_hash,
+        'amount': amount,
+    }
+    return intent.client_secret
+
+
+def owns_payment_intent(request, pid):
+    """
+    Whether the payment intent was made for this session, or its order
+    was placed by the logged in user, so the order can be completed
+    """
+    stored = request.session.get(PAYMENT_INTENT_KEY)
+    if stored and stored['id'] == pid:
+        return True
+    return request.user.is_authenticated and Order.objects.filter(
+        stripe_pid=pid, user_profile__user=request.user).exists()
+
+
+def forget_payment_intent(request):
+    """Taking the payment intent out of the session once it is paid"""
+    request.session.pop(PAYMENT_INTENT_KEY, None)
@@ -5,15 +5,17 @@ from django.contrib import messages
 from django.conf import settings
 
 from .forms import OrderForm
-from .models import Order, OrderLineItem
+from .models import Order
+from .orders import MissingProductError, get_or_build_order
+from .payments import (
+    forget_payment_intent, get_payment_intent, owns_payment_intent)
 
-from products.models import Product
 from profiles.models import UserProfile
 from profiles.forms import UserProfileForm
-from trolley.contexts import trolley_contents
+from trolley.contexts import get_trolley_contents
+from trolley.trolley import Trolley
 
 import stripe
-import json
 
 
 @require_POST
@@ -29,7 +31,7 @@ def cache_checkout_data(request):
         pid = request.POST.get('client_secret').split('_secret')[0]
         stripe.api_key = settings.STRIPE_SECRET_KEY
         stripe.PaymentIntent.modify(pid, metadata={
-            'trolley': json.dumps(request.session.get('trolley', {})),
+            'trolley': Trolley.load(request).to_json(),
             'save_del_info': request.POST.get('save_del_info'),
             'username': request.user,
         })
@@ -50,15 +52,14 @@ def checkout(request):
     creating the checkout template, adding the order form to the context
     processor and lastly rendering it all out.
     """
-    # Setting the public and secret key vars for stripe from main settings
+    # Setting the public key var for stripe from main settings
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
-    stripe_secret_key = settings.STRIPE_SECRET_KEY
 
     # Checking to see if the method is post and get the
     # shopping trolley session. Also putting the order form data
     # into a dictionary.
     if request.method == 'POST':
-        trolley = request.session.get('trolley', {})
+        trolley = Trolley.load(request)
 
         form_data = {
             'full_name': request.POST['full_name'],
@@ -79,59 +80,51 @@ def checkout(request):
 
             # Getting the payment intent id, adding the shopping
             # trolley to the model by getting and dumping the
-            # shopping trolley to json and then saving the order
-            pid = request.POST.get('client_secret').split('_secret')[0]
+            # shopping trolley to json
+            pid = request.POST.get('client_secret', '').split('_secret')[0]
+            # The payment intent id comes from the form, so an order is
+            # only completed for the session's own payment intent, or an
+            # order the logged in user has already placed
+            if not owns_payment_intent(request, pid):
+                messages.error(request, 'Sorry, this payment could not be \
+                    matched to your checkout. Please try again.')
+                return redirect(reverse('checkout'))
             order.stripe_pid = pid
-            order.original_trolley = json.dumps(trolley)
-            order.save()
-
-            # This code was taken from my trolley context.py and modified
-            for item_id, item_data in trolley.items():
-                try:
-                    # Getting product id out of the trolley, if value is an
-                    # integer, then product has no sizes and save the
-                    # order line item.
-                    product = Product.objects.get(id=item_id)
-                    if isinstance(item_data, int):
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    else:
-                        # Code taken from my trolley context.py and modified
-                        # This is for orders which have sizes and iterates
-                        # through each line item and saves them.
-                        for size, quantity in item_data['item_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-                # Error message for product if not found in database, the order
-                # is deleted and user is taken back to the view trolley page
-                except Product.DoesNotExist:
-                    messages.error(request, (
-                        "One of the products in your shopping trolley, \
-                            could not be found in the database, \
-                                Please call us for assistance!")
-                    )
-                    order.delete()
-                    return redirect(reverse('view_trolley'))
+            order.original_trolley = trolley.to_json()
+
+            # Saving the order and an order line item for each line in
+            # the trolley, with the size for products that have sizes,
+            # all in one transaction. If the webhook has already saved
+            # the order for this payment then that order is used, with
+            # the details from the order form.
+            try:
+                order, created = get_or_build_order(order, trolley)
+                if not created:
+                    Order.objects.filter(pk=order.pk).update(
+                        **order_form.cleaned_data)
+            # Error message for product if not found in database, nothing
+            # is saved and user is taken back to the view trolley page
+            except MissingProductError:
+                messages.error(request, (
+                    "One of the products in your shopping trolley, \
+                        could not be found in the database, \
+                            Please call us for assistance!")
+                )
+                return redirect(reverse('view_trolley'))
             # This session is for users who want to save there delivery
             # info to there personal profile and if all is successful then
             # the user will be taken to the checkout success page.
             request.session['save_del_info'] = 'save-del-info' in request.POST
+            # The payment intent has been paid, so the next checkout
+            # gets a new one
+            forget_payment_intent(request)
             return redirect(
                 reverse('checkout_complete', args=[order.order_number]))
         else:
             messages.error(request, 'There was an error with your order form. \
                 Please check the information you have entered.')
     else:
-        trolley = request.session.get('trolley', {})
+        trolley = Trolley.load(request)
         if not trolley:
             messages.error(request, "Your shopping trolley is empty,\
             please add a product to your shopping trolley")
@@ -140,17 +133,14 @@ def checkout(request):
         # Storing current shopping trolley in var called current_trolley
         # Also getting the final total key from the current trolley and
         # setting the stripe total as integer
-        current_trolley = trolley_contents(request)
+        current_trolley = get_trolley_contents(request)
         total = current_trolley['final_total']
         stripe_total = round(total * 100)
 
-        # Setting the secrect key on stripe, creating the payment
-        # intent and setting the stripe currency from main setting file
-        stripe.api_key = stripe_secret_key
-        intent = stripe.PaymentIntent.create(
-            amount=stripe_total,
-            currency=settings.STRIPE_CURRENCY,
-        )
+        # Getting the payment intent kept in the session, which is
+        # updated on stripe when the trolley has changed and replaced
+        # if it has already been paid
+        client_secret = get_payment_intent(request, trolley, stripe_total)
 
         # This block of code  will prefill the order form with
         # any info the user maintains in there profile page
@@ -186,7 +176,7 @@ def checkout(request):
         # Stripe public key
         'stripe_public_key': stripe_public_key,
         # Client secret key with intent
-        'client_secret': intent.client_secret,
+        'client_secret': client_secret,
     }
 
     return render(request, template, context)
@@ -238,9 +228,8 @@ def checkout_complete(request, order_number):
                 Your order number is {order_number}. A confirmation \
                 email will be sent to {order.email_address}.')
 
-    # Deleting users shopping trolley session
-    if 'trolley' in request.session:
-        del request.session['trolley']
+    # Emptying the users shopping trolley and its summary
+    Trolley.clear(request)
 
     # Setting the template and context to be rendered
     template = 'checkout/checkout_complete.html'
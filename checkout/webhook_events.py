@@ -0,0 +1,127 @@
+"""
+Saving Stripe webhook events and handling them in the background.
+
+The webhook view checks the signature of each event and saves it with
+save_event, then replies to Stripe straight away, so slow order
+creation or email sending never makes Stripe send the event again. The
+process_webhook_events command then claims the saved events and hands
+them to the StripeWH_Handler. An event that fails is tried again later,
+waiting twice as long after each attempt, until it has been tried
+WEBHOOK_MAX_ATTEMPTS times. Events are saved by their Stripe event id,
+so an event Stripe sends twice is only handled once.
+"""
+import json
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WebhookEvent
+from .webhook_handler import StripeWH_Handler
+
+# Events waiting for a worker, including ones claimed by a worker that
+# stopped before it finished, which are picked up once their claim ends
+WAITING = [WebhookEvent.PENDING, WebhookEvent.PROCESSING]
+
+
+def save_event(event, payload):
+    """
+    Saving an event sent by Stripe in one insert, an event that has
+    already been saved is left as it is
+    """
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            event_id=event['id'], event_type=event['type'], payload=payload)
+    ], ignore_conflicts=True)
+
+
+def claim_events(limit):
+    """
+    Claiming up to limit events that are waiting to be handled and
+    returning them. Each event is claimed with an update that only
+    succeeds if no other worker has claimed it first, and its claim
+    lasts WEBHOOK_CLAIM_TIMEOUT seconds so the event is picked up again
+    if the worker stops while handling it. The end of the claim is kept
+    on each event, so the worker can tell if it still holds the claim.
+    """
+    now = timezone.now()
+    claim_until = now + timedelta(seconds=settings.WEBHOOK_CLAIM_TIMEOUT)
+    waiting = WebhookEvent.objects.filter(
+        status__in=WAITING, available_at__lte=now)
+    event_ids = list(waiting.order_by('available_at').values_list(
+        'id', flat=True)[:limit])
+    claimed = [
+        event_id for event_id in event_ids
+        if waiting.filter(id=event_id).update(
+            status=WebhookEvent.PROCESSING, available_at=claim_until,
+            attempts=F('attempts') + 1)]
+    return list(WebhookEvent.objects.filter(
+        id__in=claimed, status=WebhookEvent.PROCESSING,
+        available_at=claim_until))
+
+
+def handle_event(webhook_event):
+    """
+    Passing a saved event to the handler function for its type and
+    returning the handler's response
+    """
+    event = stripe.Event.construct_from(
+        json.loads(webhook_event.payload), settings.STRIPE_SECRET_KEY)
+    handler = StripeWH_Handler()
+
+    # Map webhook events to relevant handler functions
+    event_map = {
+        'payment_intent.succeeded': handler.handle_payment_intent_succeeded,
+        'payment_intent.payment_failed':
+            handler.handle_payment_intent_payment_failed,
+    }
+    # If there's a handler for it, get it from the event map
+    # Use the generic one by default
+    event_handler = event_map.get(event['type'], handler.handle_event)
+    return event_handler(event)
+
+
+def process_event(webhook_event, max_attempts=None):
+    """
+    Handling a claimed event and recording the result. Returns the new
+    status of the event, pending if it is to be tried again, or None if
+    the claim ended and another worker may have claimed the event.
+    """
+    if max_attempts is None:
+        max_attempts = settings.WEBHOOK_MAX_ATTEMPTS
+    # An event left waiting in the batch until its claim ended is left
+    # to the worker that claims it next
+    claim_until = webhook_event.available_at
+    if claim_until <= timezone.now():
+        return None
+    try:
+        response = handle_event(webhook_event)
+        error = ''
+        if response.status_code >= 500:
+            error = response.content.decode()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+
+    now = timezone.now()
+    if not error:
+        changes = {'status': WebhookEvent.DONE, 'date_processed': now}
+    elif webhook_event.attempts >= max_attempts:
+        changes = {'status': WebhookEvent.FAILED, 'date_processed': now}
+    else:
+        delay = settings.WEBHOOK_RETRY_DELAY * 2 ** (
+            webhook_event.attempts - 1)
+        changes = {
+            'status': WebhookEvent.PENDING,
+            'available_at': now + timedelta(seconds=delay),
+        }
+    # The result is only recorded while this worker still holds the
+    # claim, so it cannot overwrite the result of a worker that claimed
+    # the event after this claim ended
+    claimed = WebhookEvent.objects.filter(
+        id=webhook_event.id, status=WebhookEvent.PROCESSING,
+        available_at=claim_until)
+    if not claimed.update(last_error=error, **changes):
+        return None
+    return changes['status']
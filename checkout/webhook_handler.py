@@ -1,16 +1,12 @@
 from django.http import HttpResponse
-
-# Django imports to help with sending emails
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
 
-from .models import Order, OrderLineItem
-from products.models import Product
+from .models import Order
+from .orders import get_or_build_order
+from outbox.mail import queue_email
 from profiles.models import UserProfile
+from trolley.trolley import Trolley
 
-import json
-import time
 
 # This code was learnt and added from the stripe video section,
 # within the django mini project, specifcally video 10 and 11.
@@ -21,30 +17,19 @@ class StripeWH_Handler:
     Handles Stripe webhooks.
     """
 
-    def __init__(self, request):
+    def __init__(self, request=None):
         self.request = request
 
     def _send_confirmation_email(self, order):
-        """Send the user a confirmation email"""
-        # Getting customers email
-        cust_email = order.email_address
-        # Rendering confirmation_email_subject file to subject
-        subject = render_to_string(
+        """Queue the user a confirmation email"""
+        # The confirmation_email_subject and confirmation_email_body files
+        # are rendered with the order and the contact email located in
+        # settings, and sent to the customers email by the outbox
+        queue_email(
             'checkout/confirmation_emails/confirmation_email_subject.txt',
-            {'order': order})
-        # Rendering confirmation_email_body file to body
-        # and contact email located in settings
-        body = render_to_string(
             'checkout/confirmation_emails/confirmation_email_body.txt',
-            {'order': order, 'contact_email': settings.DEFAULT_FROM_EMAIL})
-        # This sends using the send mail function and inside of it is the
-        # subject, body, contact email and users email
-        send_mail(
-            subject,
-            body,
-            settings.DEFAULT_FROM_EMAIL,
-            [cust_email]
-        )
+            {'order': order, 'contact_email': settings.DEFAULT_FROM_EMAIL},
+            [order.email_address])
 
     def handle_event(self, event):
         """
@@ -65,11 +50,9 @@ class StripeWH_Handler:
         trolley = intent.metadata.trolley
         save_del_info = intent.metadata.save_del_info
 
-        # Getting and storing the billing, shipping details
-        # and the final total
+        # Getting and storing the billing and shipping details
         billing_details = intent.charges.data[0].billing_details
         shipping_details = intent.shipping
-        final_total = round(intent.charges.data[0].amount / 100, 2)
 
         # Clean data in the shipping details and setting empty
         # strings as none instead of null
@@ -96,100 +79,47 @@ class StripeWH_Handler:
                 profile.default_country = shipping_details.address.country
                 profile.save()
 
-        # Setting the order exist to false and then using the payment intent
-        # to get the order info and then using iexact to make it an exact
-        # match but case-insensitive
-        order_exists = False
-        # Creating a delay and setting the attempt to 1 and then a while
-        # loop will execute up to 5 times
-        attempt = 1
-        while attempt <= 5:
-            try:
-                order = Order.objects.get(
-                    full_name__iexact=shipping_details.name,
-                    email_address__iexact=billing_details.email,
-                    phone_number__iexact=shipping_details.phone,
-                    address_line1__iexact=shipping_details.address.line1,
-                    address_line2__iexact=shipping_details.address.line2,
-                    town_or_city__iexact=shipping_details.address.city,
-                    county__iexact=shipping_details.address.state,
-                    postcode__iexact=shipping_details.address.postal_code,
-                    country__iexact=shipping_details.address.country,
-                    final_total=final_total,
-                    # adding on the shopping trolley and pid
-                    original_trolley=trolley,
-                    stripe_pid=pid,
-                )
-                # if the order does exist a 200 http response is sent to stripe
-                # with a message that the order is verified and already exists
-                order_exists = True
-                break
-            # If the order does not exist, it then needs to be created, just
-            # like in the views.py
-            except Order.DoesNotExist:
-                # Incrementing the attempt by one and then using the python
-                # sleep module to then make it sleep for one second
-                attempt += 1
-                time.sleep(1)
-        # This is outside the while loop and will check to see if
-        # order exists is true and if so return a 200 response
-        if order_exists:
-            # Sending confirmation email
-            self._send_confirmation_email(order)
+        # Getting the order the checkout view saved for the payment intent,
+        # using the unique payment intent id, or creating the order here if
+        # the checkout view has not saved it, for example when the browser
+        # was closed before the payment was confirmed
+        order = Order(
+            full_name=shipping_details.name,
+            email_address=billing_details.email,
+            phone_number=shipping_details.phone,
+            address_line1=shipping_details.address.line1,
+            address_line2=shipping_details.address.line2,
+            town_or_city=shipping_details.address.city,
+            county=shipping_details.address.state,
+            postcode=shipping_details.address.postal_code,
+            country=shipping_details.address.country,
+            user_profile=profile,
+            # adding on the shopping trolley and pid
+            original_trolley=trolley,
+            stripe_pid=pid,
+        )
+        try:
+            # The order is built in the same way as in the checkouts
+            # views.py but the shopping trolley is loaded from the json
+            # payment intent instead of the trolley session
+            order, created = get_or_build_order(
+                order, Trolley.from_json(trolley))
+        # If anything goes wrong nothing has been saved, as the order is
+        # built in one transaction, and a 500 server error is returned
+        except Exception as e:
+            return HttpResponse(
+                content=f'Webhook received: {event["type"]} | ERROR: {e}',
+                status=500)
+
+        # Sending confirmation email using the webhook
+        self._send_confirmation_email(order)
+        if not created:
+            # if the order does exist a 200 http response is sent to stripe
+            # with a message that the order is verified and already exists
             return HttpResponse(
                 content=f'Webhook received: {event["type"]} | \
                     SUCCESS: Verified order already in database',
                 status=200)
-        else:
-            order = None
-            try:
-                # Creating the form to save within the webhook
-                order = Order.objects.create(
-                    full_name=shipping_details.name,
-                    email_address=billing_details.email,
-                    phone_number=shipping_details.phone,
-                    address_line1=shipping_details.address.line1,
-                    address_line2=shipping_details.address.line2,
-                    town_or_city=shipping_details.address.city,
-                    county=shipping_details.address.state,
-                    postcode=shipping_details.address.postal_code,
-                    country=shipping_details.address.country,
-                    user_profile=profile,
-                    # adding on the shopping trolley and pid
-                    original_trolley=trolley,
-                    stripe_pid=pid,
-                )
-                # Code was taken from the checkouts views.py but the
-                # shopping trolley is loaded from the json payment intent
-                # instead of the trolley session
-                for item_id, item_data in json.loads(trolley).items():
-                    product = Product.objects.get(id=item_id)
-                    if isinstance(item_data, int):
-                        order_line_item = OrderLineItem(
-                            order=order,
-                            product=product,
-                            quantity=item_data,
-                        )
-                        order_line_item.save()
-                    else:
-                        for size, quantity in item_data['item_size'].items():
-                            order_line_item = OrderLineItem(
-                                order=order,
-                                product=product,
-                                quantity=quantity,
-                                product_size=size,
-                            )
-                            order_line_item.save()
-            # If anything goes wrong this deletes the order if it was created
-            # and returns a 500 server error to stripe
-            except Exception as e:
-                if order:
-                    order.delete()
-                return HttpResponse(
-                    content=f'Webhook received: {event["type"]} | ERROR: {e}',
-                    status=500)
-        # Sending confirmation email using the webhook
-        self._send_confirmation_email(order)
         # The order has been created by the webhook 200 http response
         return HttpResponse(
             content=f'Webhook received: {event["type"]} | \
@@ -14,8 +14,9 @@ from django.http import HttpResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
-# This is for the webhook handler class
-from checkout.webhook_handler import StripeWH_Handler
+# This is for saving the event to be handled by the
+# process_webhook_events command
+from checkout.webhook_events import save_event
 
 import stripe
 
@@ -46,23 +47,9 @@ def webhook(request):
     except Exception as e:
         return HttpResponse(content=e, status=400)
 
-    # Set up a webhook handler
-    handler = StripeWH_Handler(request)
-
-    # Map webhook events to relevant handler functions
-    event_map = {
-        'payment_intent.succeeded': handler.handle_payment_intent_succeeded,
-        'payment_intent.payment_failed':
-            handler.handle_payment_intent_payment_failed,
-    }
-
-    # Get the webhook type from Stripe
-    event_type = event['type']
-
-    # If there's a handler for it, get it from the event map
-    # Use the generic one by default
-    event_handler = event_map.get(event_type, handler.handle_event)
-
-    # Call the event handler with the event
-    response = event_handler(event)
-    return response
+    # Saving the event to be handled by the process_webhook_events
+    # command and replying to Stripe straight away, so Stripe does not
+    # send the event again while the order is being created
+    save_event(event, payload.decode())
+    return HttpResponse(
+        content=f'Webhook received: {event["type"]}', status=200)
@@ -2,10 +2,8 @@ from django.shortcuts import render, redirect, reverse
 from django.contrib import messages
 # This is for the secret keys in the settings
 from django.conf import settings
-# Django imports to help with sending emails
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 
+from outbox.mail import queue_email
 from profiles.models import UserProfile
 
 # Create your views here.
@@ -62,23 +60,18 @@ def send_contact_email(request):
         contact_subject = request.POST['contact-subject']
         contact_message = request.POST['contact-message']
 
-        # Body var is using the render to string method and
-        # passing the values to the contact email body text file
-        # to the format i have specified
-        body = render_to_string(
+        # Queueing the email to be sent by the outbox, the subject and
+        # body are rendered from the contact email text files with the
+        # values from the contact form. The structure is subject and
+        # body templates, their values, to email and from email
+        queue_email(
+            'home/contact_email/contact_email_subject.txt',
             'home/contact_email/contact_email_body.txt',
-            {'username': contact_user, 'fullname': contact_fullname,
+            {'username': str(contact_user), 'fullname': contact_fullname,
              'message': contact_message, 'user_email': contact_email,
-             'subject': contact_subject})
-
-        # Django send mail method, structure has to be
-        # subject, message, from email and to email
-        send_mail(
-            contact_subject,
-            body,
-            contact_email,
+             'subject': contact_subject},
             [settings.DEFAULT_FROM_EMAIL],
-        )
+            from_email=contact_email)
         # Message informing user using toasts that the message
         # has sent and redirecting them to the home page
         messages.success(
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """
+    Showing the emails in the outbox, so failed emails can be found
+    and set back to pending to be sent again
+    """
+    readonly_fields = ('subject_template', 'body_template', 'context',
+                       'from_email', 'recipients', 'attempts',
+                       'last_error', 'date_created', 'date_sent')
+    list_display = ('body_template', 'recipients', 'status', 'attempts',
+                    'date_created', 'date_sent')
+    list_filter = ('status', 'body_template')
+    ordering = ('-date_created',)
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
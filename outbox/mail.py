@@ -0,0 +1,169 @@
+"""
+Queueing emails in the outbox and sending them in the background.
+
+Views and the webhook call queue_email, which only saves the email. The
+send_outbox command claims the waiting emails in batches, renders them
+and sends each batch over one connection to the mail server, opened
+with the EMAIL_BACKEND setting. An email that cannot be sent is tried
+again later, waiting twice as long after each attempt, and is marked as
+failed after OUTBOX_MAX_ATTEMPTS attempts so it can be checked in the
+admin.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# Emails waiting to be sent, including ones claimed by a sender that
+# stopped before it finished, which are picked up once their claim ends
+WAITING = [OutgoingEmail.PENDING, OutgoingEmail.SENDING]
+
+# Key marking a model saved in the context by its primary key
+MODEL_KEY = '__model__'
+
+# Number of times sending one email can wait on the mail server for up
+# to EMAIL_TIMEOUT seconds, once to open the connection and once to send
+WAITS_PER_EMAIL = 2
+
+
+def _save_context(context):
+    return {
+        name: {MODEL_KEY: value._meta.label_lower, 'pk': value.pk}
+        if isinstance(value, models.Model) else value
+        for name, value in context.items()}
+
+
+def _load_context(context):
+    loaded = {}
+    for name, value in context.items():
+        if isinstance(value, dict) and MODEL_KEY in value:
+            model = apps.get_model(value[MODEL_KEY])
+            value = model._default_manager.get(pk=value['pk'])
+        loaded[name] = value
+    return loaded
+
+
+def queue_email(subject_template, body_template, context, recipients,
+                from_email=None):
+    """
+    Saving an email to be sent by the send_outbox command. The context
+    can hold models and values that can be saved as JSON.
+    """
+    return OutgoingEmail.objects.create(
+        subject_template=subject_template,
+        body_template=body_template,
+        context=_save_context(context),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients))
+
+
+def render_email(email):
+    """Rendering a saved email into a message that can be sent"""
+    context = _load_context(email.context)
+    # Email headers cannot have new lines, so the subject is one line
+    subject = ' '.join(
+        render_to_string(email.subject_template, context).split())
+    body = render_to_string(email.body_template, context)
+    return EmailMessage(subject, body, email.from_email, email.recipients)
+
+
+def claim_limit(limit):
+    """
+    Lowering limit so a batch can be sent before its claim ends, even
+    if the mail server makes every email wait as long as EMAIL_TIMEOUT
+    """
+    if not settings.EMAIL_TIMEOUT:
+        return limit
+    email_time = WAITS_PER_EMAIL * settings.EMAIL_TIMEOUT
+    return max(1, min(limit, settings.OUTBOX_CLAIM_TIMEOUT // email_time))
+
+
+def claim_emails(limit):
+    """
+    Claiming up to limit emails that are waiting to be sent and
+    returning them. Each email is claimed with an update that only
+    succeeds if no other sender has claimed it first, and its claim
+    lasts OUTBOX_CLAIM_TIMEOUT seconds so the email is picked up again
+    if the sender stops while sending it. The limit is lowered with
+    claim_limit so the batch is sent before the claim ends.
+    """
+    limit = claim_limit(limit)
+    now = timezone.now()
+    claim_until = now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+    waiting = OutgoingEmail.objects.filter(
+        status__in=WAITING, available_at__lte=now)
+    email_ids = list(waiting.order_by('available_at').values_list(
+        'id', flat=True)[:limit])
+    claimed = [
+        email_id for email_id in email_ids
+        if waiting.filter(id=email_id).update(
+            status=OutgoingEmail.SENDING, available_at=claim_until,
+            attempts=F('attempts') + 1)]
+    return list(OutgoingEmail.objects.filter(id__in=claimed))
+
+
+def send_emails(emails, max_attempts=None):
+    """
+    Sending claimed emails over one connection and recording the result
+    of each. Returns the new status of each email by id.
+    """
+    if max_attempts is None:
+        max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+    statuses = {}
+    connection = get_connection()
+    try:
+        for email in emails:
+            try:
+                message = render_email(email)
+                # Opening the connection does nothing if it is already
+                # open, so it is only opened again after an error
+                connection.open()
+                if connection.send_messages([message]):
+                    error = ''
+                else:
+                    error = 'The email was not sent'
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                _close(connection)
+            statuses[email.id] = _record_result(email, error, max_attempts)
+    finally:
+        _close(connection)
+    return statuses
+
+
+def _close(connection):
+    # Closing a broken connection can fail as well, which still leaves
+    # it closed, so the next email opens a new one
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def _record_result(email, error, max_attempts):
+    now = timezone.now()
+    if not error:
+        changes = {'status': OutgoingEmail.SENT, 'date_sent': now}
+    elif email.attempts >= max_attempts:
+        changes = {'status': OutgoingEmail.FAILED}
+    else:
+        delay = settings.OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+        changes = {
+            'status': OutgoingEmail.PENDING,
+            'available_at': now + timedelta(seconds=delay),
+        }
+    # The result is only recorded while this sender still holds the
+    # claim, so it cannot overwrite the result of a sender that claimed
+    # the email after this claim ended
+    claimed = OutgoingEmail.objects.filter(
+        id=email.id, status=OutgoingEmail.SENDING,
+        available_at=email.available_at)
+    claimed.update(last_error=error, **changes)
+    return changes['status']
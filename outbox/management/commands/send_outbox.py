@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from outbox.mail import claim_emails, send_emails
+from outbox.models import OutgoingEmail
+
+
+class Command(BaseCommand):
+    """
+    Sends the emails waiting in the outbox. Emails are claimed in
+    batches and each batch is sent over one connection to the mail
+    server, instead of a new connection for every email. Several copies
+    of the command can run at once, as each email can only be claimed
+    by one of them. Runs until stopped, or until no emails are waiting
+    with --once.
+    """
+    help = 'Send the emails waiting in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of emails sent over each connection, lowered if '
+                 'the batch could take longer than its claim')
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=settings.OUTBOX_MAX_ATTEMPTS,
+            help='Number of times an email is tried before it fails')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Number of seconds to wait when no emails are waiting')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Stop once no emails are waiting')
+
+    def handle(self, *args, **options):
+        counts = dict.fromkeys(
+            [OutgoingEmail.SENT, OutgoingEmail.PENDING,
+             OutgoingEmail.FAILED], 0)
+        while True:
+            emails = claim_emails(options['batch_size'])
+            if not emails:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            statuses = send_emails(emails, options['max_attempts'])
+            for email_id, status in statuses.items():
+                counts[status] += 1
+                if status != OutgoingEmail.SENT:
+                    self.stderr.write(f'Email {email_id} is {status}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {counts[OutgoingEmail.SENT]} emails, '
+            f'{counts[OutgoingEmail.PENDING]} will be tried again and '
+            f'{counts[OutgoingEmail.FAILED]} failed'))
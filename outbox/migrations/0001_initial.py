@@ -0,0 +1,43 @@
+# Generated by Django 3.2.4 on 2026-10-17 10:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                 primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_template', models.CharField(max_length=255)),
+                ('body_template', models.CharField(max_length=255)),
+                ('context', models.JSONField(default=dict)),
+                ('from_email', models.CharField(max_length=254)),
+                ('recipients', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[
+                    ('pending', 'Pending'), ('sending', 'Sending'),
+                    ('sent', 'Sent'), ('failed', 'Failed')],
+                    default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(
+                    default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_sent', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(
+                fields=['status', 'available_at'],
+                name='outgoing_email_status_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting in the outbox to be sent by the send_outbox
+    command. Requests only save the email, so a slow or unavailable
+    mail server never holds up or fails a page. The subject and body
+    are rendered from their templates when the email is sent, with the
+    context saved here, where models are saved by their primary key.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject_template = models.CharField(max_length=255)
+    body_template = models.CharField(max_length=255)
+    context = models.JSONField(default=dict)
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the email can next be picked up, pushed back while it is
+    # being sent and after each failed attempt
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Used by send_outbox to find the emails waiting to be sent
+            models.Index(
+                fields=['status', 'available_at'],
+                name='outgoing_email_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.body_template} to {", ".join(self.recipients)}'
@@ -13,6 +13,8 @@ class ProductAdmin(admin.ModelAdmin):
         'category',
         'product_price',
         'product_rating',
+        'review_count',
+        'review_rating_average',
         'product_image',
     )
 
@@ -0,0 +1,65 @@
+"""
+Search as you type suggestions for the product search box.
+
+Each worker keeps a prefix index of the product names in memory, a
+sorted list of every name and of the name starting from each of its
+words, so "sho" suggests "Running Shorts" as well as "Shoulder Bag".
+Finding the suggestions for a prefix is a binary search into the list
+followed by reading the next few entries, so no database query is made.
+
+The index is rebuilt when the catalogue version changes. The version is
+only looked up every few seconds, so most suggestions do not touch the
+cache either and a new product can take a few seconds to be suggested.
+"""
+import bisect
+
+from django.conf import settings
+
+from .caching import WorkerIndex
+from .models import Product
+
+
+class PrefixIndex:
+    """A sorted list of lower case names and name endings to search"""
+
+    def __init__(self, products):
+        entries = set()
+        for product_id, name in products:
+            words = name.lower().split()
+            for index in range(len(words)):
+                entries.add((' '.join(words[index:]), name, product_id))
+        self.entries = sorted(entries)
+        self.keys = [entry[0] for entry in self.entries]
+
+    def complete(self, prefix, limit):
+        """
+        Returning up to limit (name, product id) pairs whose name, or
+        one of the words in it, starts with the prefix
+        """
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        position = bisect.bisect_left(self.keys, prefix)
+        while position < len(self.entries) and len(results) < limit:
+            key, name, product_id = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            position += 1
+            if product_id not in seen:
+                seen.add(product_id)
+                results.append((name, product_id))
+        return results
+
+
+# This worker's prefix index of the product names
+_index = WorkerIndex(
+    lambda: PrefixIndex(Product.objects.values_list('id', 'product_name')))
+
+
+def complete(prefix, limit=None):
+    """Returning the product name suggestions for the prefix"""
+    if limit is None:
+        limit = settings.AUTOCOMPLETE_LIMIT
+    return _index.get().complete(prefix, limit)
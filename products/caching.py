@@ -0,0 +1,164 @@
+"""
+Versioned caching for the product catalogue.
+
+Each kind of cached data has a version number stored in the cache,
+for example the catalogue version is bumped by the product and category
+signals. Cached values are stored along with the version they were built
+from, so bumping the version makes them out of date without having to
+find and delete every cached page.
+
+When a value is out of date only one request rebuilds it, any other
+requests arriving at the same time are given the old value until the new
+one is ready. This stops a rush of identical queries hitting the database
+each time the catalogue changes.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+
+# Bumped only when a product price changes or a product is deleted, this
+# is used by the trolley summaries stored in the sessions
+PRICES = 'prices'
+
+# Bumped when a review changes the review totals of a product, this is
+# used by the rating counts and anything else built from the ratings
+RATINGS = 'ratings'
+
+# Number of seconds a rebuild lock is held for, this is how long other
+# requests will keep getting the old value if a rebuild fails part way
+REBUILD_LOCK_TIMEOUT = 30
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name=CATALOG):
+    """
+    Returning the current version number. A missing version is started
+    from the current time in milliseconds rather than 1, so if it is
+    ever evicted from the cache the new version is still higher than any
+    version a cached value was built from.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def get_versions(names):
+    """
+    Returning the current versions for several names as a tuple, read
+    from the cache in one lookup
+    """
+    found = cache.get_many([_version_key(name) for name in names])
+    return tuple(
+        found.get(_version_key(name)) or get_version(name)
+        for name in names)
+
+
+def bump_version(name=CATALOG):
+    """Increasing the version, so anything cached for it is out of date"""
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The version is not in the cache yet so start it off, then
+        # bump it in case another request started it first
+        get_version(name)
+        return cache.incr(key)
+
+
+def get_or_build(key, builder, timeout, version_name=CATALOG):
+    """
+    Returning the cached value for the key if it was built from the
+    current version, else calling builder to build and cache it again.
+    If another request is already rebuilding an out of date value then
+    the out of date value is returned instead of building it twice.
+    A tuple of version names can be given for a value built from more
+    than one kind of data, it is out of date when any of them changes.
+    """
+    if isinstance(version_name, tuple):
+        version = get_versions(version_name)
+    else:
+        version = get_version(version_name)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, version, REBUILD_LOCK_TIMEOUT)
+    if not locked and entry is not None:
+        return entry[1]
+
+    try:
+        value = builder()
+        cache.set(key, (version, value), timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+class VersionCheck:
+    """
+    The version as last looked up by this worker. It is only looked up
+    again every INDEX_VERSION_CHECK_INTERVAL seconds, so most uses do
+    not touch the cache or database and a change can take a few seconds
+    to be seen.
+    """
+
+    def __init__(self, version_name=CATALOG):
+        self.version_name = version_name
+        self.version = None
+        self.checked_at = None
+
+    def get(self):
+        """
+        Returning the version, looking it up if it is due a check. For a
+        tuple of version names the versions are returned as a tuple.
+        """
+        now = time.monotonic()
+        if self.checked_at is None or (
+                now - self.checked_at
+                >= settings.INDEX_VERSION_CHECK_INTERVAL):
+            if isinstance(self.version_name, tuple):
+                self.version = get_versions(self.version_name)
+            else:
+                self.version = get_version(self.version_name)
+            self.checked_at = now
+        return self.version
+
+
+class WorkerIndex:
+    """
+    Data kept in memory by each worker and built again by calling
+    builder when the version changes. The version is checked with a
+    VersionCheck, so a change can take a few seconds to show.
+    """
+
+    def __init__(self, builder, version_name=CATALOG):
+        self.builder = builder
+        self.version_check = VersionCheck(version_name)
+        self.lock = threading.Lock()
+        self.value = None
+        self.version = None
+
+    def get(self):
+        """Returning the data, building it again if it is out of date"""
+        version = self.version_check.get()
+        if version == self.version:
+            return self.value
+
+        with self.lock:
+            # Another thread may have built it while waiting
+            if version != self.version:
+                self.value = self.builder()
+                self.version = version
+        return self.value
@@ -0,0 +1,124 @@
+"""
+Reading and writing the product catalogue as CSV or JSON Lines.
+
+Used by the catalog_import and catalog_export management commands. Rows
+are read and written one at a time, so a catalogue of any size can be
+streamed without holding the whole file in memory. Each row has the
+product fields below, with the category given by its category name.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+CATALOG_FIELDS = (
+    'sku', 'product_name', 'product_description', 'product_price',
+    'product_rating', 'product_sizes', 'product_image_url',
+    'product_image', 'category',
+)
+FORMATS = ('csv', 'jsonl')
+
+
+class CatalogError(ValueError):
+    """Raised for a catalogue row that cannot be read"""
+
+
+def guess_format(path):
+    """Working out the format from the file name, CSV unless .jsonl"""
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yielding each row of the catalogue file as a dictionary"""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise CatalogError(
+                    f'Line {number}: Invalid JSON, {error}') from error
+
+
+class RowWriter:
+    """Writing catalogue rows to a stream in CSV or JSON Lines"""
+
+    def __init__(self, stream, file_format):
+        self.stream = stream
+        self.file_format = file_format
+        if file_format == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.file_format == 'csv':
+            self.writer.writerow({
+                field: '' if value is None else value
+                for field, value in row.items()})
+        else:
+            self.stream.write(json.dumps(row, default=str) + '\n')
+
+
+def _text(value):
+    """Empty values are stored as null, everything else as a string"""
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def has_changed(current, fields, names):
+    """
+    Whether any of the named fields read from a file differ from the
+    current values of the product. An empty string and null are both
+    exported as an empty CSV cell, so they are the same value here.
+    """
+    return any(
+        _empty(current[name]) != _empty(fields[name]) for name in names)
+
+
+def _empty(value):
+    return None if value == '' else value
+
+
+def _decimal(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation as error:
+        raise CatalogError(f'Invalid {field}: {value!r}') from error
+
+
+def _boolean(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_row(row):
+    """
+    Turning a row read from a catalogue file into the product field
+    values, the category is left as its name for the caller to look up
+    """
+    if not row.get('product_name'):
+        raise CatalogError('Missing product_name')
+    price = _decimal(row.get('product_price'), 'product_price')
+    if price is None:
+        raise CatalogError('Missing product_price')
+    return {
+        'sku': _text(row.get('sku')),
+        'product_name': str(row['product_name']),
+        'product_description': str(row.get('product_description') or ''),
+        'product_price': price,
+        'product_rating': _decimal(
+            row.get('product_rating'), 'product_rating'),
+        'product_sizes': _boolean(row.get('product_sizes')),
+        'product_image_url': _text(row.get('product_image_url')),
+        'product_image': _text(row.get('product_image')) or '',
+        'category': _text(row.get('category')),
+    }
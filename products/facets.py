@@ -0,0 +1,149 @@
+"""
+Facet counts for the products page.
+
+The number of products in each category, price band and rating bucket
+are worked out together with one GROUP BY query over the filtered
+products, and the result is cached for each set of filters until the
+catalogue or the product ratings change.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .caching import CATALOG, RATINGS, get_or_build
+from .models import PRODUCT_RATING
+from .search import search_terms
+
+# Price bands shown on the products page as (label, lowest, highest),
+# the lowest price is included and the highest price is not
+PRICE_BANDS = (
+    ('Under £25', None, 25),
+    ('£25 to £50', 25, 50),
+    ('£50 to £100', 50, 100),
+    ('£100 and over', 100, None),
+)
+
+# Rating buckets go from 5 stars down to 1 star using the rating the
+# product cards show and the rating sort uses, the average of the
+# product reviews or the product's own rating if it has no reviews.
+# Products with neither are counted in bucket 0.
+RATING_BUCKETS = (5, 4, 3, 2, 1)
+
+# The counts are built from the products and their review totals
+FACET_VERSIONS = (CATALOG, RATINGS)
+
+
+def _price_band():
+    """Case expression numbering the price band a product is in"""
+    whens = []
+    for index, (label, lowest, highest) in enumerate(PRICE_BANDS):
+        lookups = {}
+        if lowest is not None:
+            lookups['product_price__gte'] = lowest
+        if highest is not None:
+            lookups['product_price__lt'] = highest
+        whens.append(When(then=Value(index), **lookups))
+    return Case(*whens, default=Value(None), output_field=IntegerField())
+
+
+def _rating_bucket():
+    """
+    Case expression giving the whole star rating of a product, from the
+    rating_value annotation
+    """
+    whens = [When(
+        review_rating_average__isnull=True, product_rating__isnull=True,
+        then=Value(0))]
+    whens += [When(rating_value__gte=stars, then=Value(stars))
+              for stars in RATING_BUCKETS]
+    return Case(*whens, default=Value(1), output_field=IntegerField())
+
+
+def facet_cache_key(categories, query):
+    """
+    Creating the cache key from the normalized filters, so the
+    same categories in a different order or a search with different
+    spacing and capitals share the same cached facets
+    """
+    normalized = [
+        ','.join(sorted(set(categories or []))),
+        ' '.join(search_terms(query)) if query else '',
+    ]
+    digest = hashlib.md5('|'.join(normalized).encode()).hexdigest()
+    return f'products:facets:{digest}'
+
+
+def facet_rows(products):
+    """
+    The grouped query counting the filtered products by category, price
+    band and rating bucket
+    """
+    return products.order_by().annotate(
+        rating_value=PRODUCT_RATING,
+    ).annotate(
+        price_band=_price_band(),
+        rating_bucket=_rating_bucket(),
+    ).values(
+        'category__category_name',
+        'category__category_friendly_name',
+        'price_band',
+        'rating_bucket',
+    ).annotate(total=Count('pk'))
+
+
+def compute_facets(products):
+    """
+    Counting the products in each category, price band and rating
+    bucket with a single grouped query over the filtered products
+    """
+    rows = facet_rows(products)
+
+    categories = {}
+    price_bands = [0] * len(PRICE_BANDS)
+    ratings = dict.fromkeys(RATING_BUCKETS + (0,), 0)
+    for row in rows:
+        name = row['category__category_name']
+        if name is not None:
+            category = categories.setdefault(name, {
+                'category_name': name,
+                'category_friendly_name': row[
+                    'category__category_friendly_name'],
+                'count': 0,
+            })
+            category['count'] += row['total']
+        if row['price_band'] is not None:
+            price_bands[row['price_band']] += row['total']
+        ratings[row['rating_bucket']] += row['total']
+
+    return {
+        'categories': sorted(
+            categories.values(), key=lambda c: c['category_name']),
+        'price_bands': [
+            {'label': band[0], 'count': count}
+            for band, count in zip(PRICE_BANDS, price_bands)],
+        'ratings': [
+            {'stars': stars, 'count': ratings[stars]}
+            for stars in RATING_BUCKETS],
+        'unrated': ratings[0],
+    }
+
+
+def product_count(facets):
+    """The number of products counted, every product has a rating bucket"""
+    return sum(rating['count'] for rating in facets['ratings']) + (
+        facets['unrated'])
+
+
+def get_facets(get_products, categories=None, query=None):
+    """
+    Returning the facets for the filtered products from the cache,
+    or working them out and caching them if they are not cached yet
+    or the catalogue or ratings have changed since they were cached.
+    get_products is only called to get the filtered products when the
+    facets have to be worked out.
+    """
+    return get_or_build(
+        facet_cache_key(categories, query),
+        lambda: compute_facets(get_products()),
+        settings.FACETS_CACHE_TIMEOUT, FACET_VERSIONS)
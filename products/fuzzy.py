@@ -0,0 +1,136 @@
+"""
+Typo tolerant product search, used when a search finds nothing.
+
+Each worker keeps a trigram index of the words in the product names and
+SKUs in memory. A misspelt word such as "protien" is split into its
+three letter trigrams, and only the words sharing one of those trigrams
+are looked at and scored, so the search never compares the query with
+every product. Products are then scored by how closely each of the
+searched words matches a word in their name or SKU.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, FloatField, Value, When
+
+from .caching import WorkerIndex
+from .models import Product
+from .search import search_terms
+
+
+def trigrams(word):
+    """
+    Splitting a word into its three letter trigrams. The word is
+    padded with spaces like PostgreSQL's pg_trgm, so the start and end
+    of the word count for more than the middle.
+    """
+    padded = f'  {word} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def similarity(shared, first, second):
+    """The number of shared trigrams out of all the trigrams in the words"""
+    return shared / (first + second - shared)
+
+
+class TrigramIndex:
+    """
+    The words in the product names and SKUs with the products each
+    word is in, and the words each trigram is in
+    """
+
+    def __init__(self, products):
+        self.products = defaultdict(set)
+        self.word_trigrams = {}
+        self.trigram_words = defaultdict(list)
+        for product_id, name, sku in products:
+            for word in search_terms(f'{name} {sku or ""}'):
+                self.products[word].add(product_id)
+        for word in self.products:
+            self.word_trigrams[word] = trigrams(word)
+            for trigram in self.word_trigrams[word]:
+                self.trigram_words[trigram].append(word)
+
+    def similar_words(self, term, threshold):
+        """
+        Returning the words similar to the term with their similarity.
+        To be similar enough a word has to share at least a threshold
+        share of the term's trigrams, so it must contain one of the
+        rarest few of them. Only the words containing those rarest
+        trigrams are scored, which skips the very common trigrams that
+        start thousands of words.
+        """
+        term_trigrams = trigrams(term)
+        needed = max(1, math.ceil(threshold * len(term_trigrams)))
+        rarest = sorted(
+            term_trigrams,
+            key=lambda trigram: len(self.trigram_words.get(trigram, ())))
+        candidates = set()
+        for trigram in rarest[:len(rarest) - needed + 1]:
+            candidates.update(self.trigram_words.get(trigram, ()))
+
+        words = {}
+        for word in candidates:
+            word_trigrams = self.word_trigrams[word]
+            score = similarity(
+                len(term_trigrams & word_trigrams), len(term_trigrams),
+                len(word_trigrams))
+            if score >= threshold:
+                words[word] = score
+        return words
+
+    def search(self, query, threshold, limit):
+        """
+        Returning up to limit (product id, score) pairs for the products
+        with a word similar to every searched word, best matches first.
+        A product's score is the average similarity of its best matching
+        word for each searched word.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        scores = None
+        for term in terms:
+            best = {}
+            for word, score in self.similar_words(term, threshold).items():
+                for product_id in self.products[word]:
+                    if score > best.get(product_id, 0):
+                        best[product_id] = score
+            if scores is None:
+                scores = best
+            else:
+                scores = {product_id: scores[product_id] + score
+                          for product_id, score in best.items()
+                          if product_id in scores}
+            if not scores:
+                return []
+        results = sorted(
+            scores.items(), key=lambda result: (-result[1], result[0]))
+        return [(product_id, score / len(terms))
+                for product_id, score in results[:limit]]
+
+
+# This worker's trigram index of the product names and SKUs
+_index = WorkerIndex(lambda: TrigramIndex(
+    Product.objects.values_list('id', 'product_name', 'sku')))
+
+
+def fuzzy_search_products(products, query):
+    """
+    Filtering the products queryset down to the products that closely
+    match the search query, annotated with a search_rank like the full
+    text search where a higher number is a closer match
+    """
+    matches = _index.get().search(
+        query, settings.FUZZY_SEARCH_THRESHOLD, settings.FUZZY_SEARCH_LIMIT)
+    if not matches:
+        return products.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    rank = Case(
+        *[When(pk=product_id, then=Value(score))
+          for product_id, score in matches],
+        default=Value(0.0), output_field=FloatField())
+    return products.filter(
+        pk__in=[product_id for product_id, score in matches]).annotate(
+            search_rank=rank)
@@ -0,0 +1,204 @@
+"""
+Building the list of products shown on the products page.
+
+The sort, direction, category and search get parameters are turned into
+a normalized set of listing parameters, and the page of products and
+the product total built from them are cached against the catalogue
+version. Any change to a product or category bumps the version, so the
+next request rebuilds the listing. Listings sorted by rating are also
+cached against the ratings version, which reviews bump, and the facet
+counts are cached separately by the facets module. The review counts on
+the product cards of the other sorts are refreshed when the catalogue
+changes or the cached listing expires.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from .caching import CATALOG, RATINGS, get_or_build
+from .facets import get_facets, product_count
+from .fuzzy import fuzzy_search_products
+from .models import PRODUCT_RATING, Product, Category
+from .pagination import KeysetPaginator
+from .search import search_products, search_terms
+
+# The sort keys the products page can be sorted by, these are
+# matched to the sort get parameter from the sort selector. The
+# product id is always added on the end by the paginator. The rating
+# sort uses the same rating the product cards show, the average of the
+# product reviews or the product's own rating if it has no reviews.
+# Each sort has an index on its own and one starting with the category,
+# so a page is read straight from an index with or without a category.
+# The category sort uses the category name kept on each product, which
+# is empty for products without a category so they come first.
+PRODUCT_SORT_KEYS = {
+    'product_price': F('product_price'),
+    'product_rating': PRODUCT_RATING,
+    'product_name': Lower('product_name'),
+    'category': F('category_name'),
+}
+
+# The versions each sort's listing is cached against
+LISTING_VERSIONS = {'product_rating': (CATALOG, RATINGS)}
+
+
+def listing_params(query_params):
+    """
+    Turning the get parameters into the normalized listing parameters,
+    unknown sorts are dropped, categories are sorted and the search is
+    reduced to its lower case words, so urls that show the same
+    products share the same cached listing.
+    """
+    sort = query_params.get('sort')
+    if sort not in PRODUCT_SORT_KEYS:
+        sort = None
+    descending = sort is not None and query_params.get('direction') == 'desc'
+
+    categories = None
+    if 'category' in query_params:
+        categories = sorted(
+            {name for name in query_params['category'].split(',') if name})
+
+    search = None
+    if query_params.get('search'):
+        search = ' '.join(search_terms(query_params['search']))
+
+    return {
+        'sort': sort,
+        'descending': descending,
+        'categories': categories,
+        'search': search,
+        'cursor': query_params.get('cursor') or None,
+    }
+
+
+def filter_products(params):
+    """
+    Running the category and search filters for a listing, returning
+    the products, the chosen categories and whether the search only
+    found close matches
+    """
+    # Only the columns the product cards use are loaded, the long
+    # product description is left out and the category is joined in
+    products = Product.objects.select_related('category').defer(
+        'product_description')
+
+    # Filtering the products by the ids of the categories in the list,
+    # rather than joining the category names, so the products of one
+    # category are read in order from the indexes starting with the
+    # category
+    categories = None
+    if params['categories'] is not None:
+        categories = list(Category.objects.filter(
+            category_name__in=params['categories']))
+        products = products.filter(
+            category__in=[category.id for category in categories])
+
+    # Searching the product name and description using the search
+    # index. If nothing matches, the product names and SKUs closest to
+    # the search are shown instead in case there was a typo.
+    fuzzy_search = False
+    if params['search'] is not None:
+        searched = search_products(products, params['search'])
+        if not searched.exists():
+            searched = fuzzy_search_products(products, params['search'])
+            fuzzy_search = True
+        products = searched
+
+    return {
+        'products': products,
+        'categories': categories,
+        'fuzzy_search': fuzzy_search,
+    }
+
+
+def build_listing(params, filtered):
+    """Running the sort and page queries for a listing"""
+    products = filtered['products']
+
+    # Choosing the sort keys for the paginator, products are ordered by
+    # their id if no sort has been chosen. If a search has been made and
+    # no sort has been chosen the best matches are shown first.
+    sort_keys = []
+    if params['sort']:
+        sort_keys = [PRODUCT_SORT_KEYS[params['sort']]]
+    descending = params['descending']
+    if params['search'] is not None and not sort_keys:
+        sort_keys = [F('search_rank')]
+        descending = True
+
+    # Paginating the products using the cursor from the previous page,
+    # the paginator name is the sort so cursors only work for one sort
+    paginator = KeysetPaginator(
+        products, sort_keys, descending=descending,
+        per_page=settings.PRODUCTS_PER_PAGE,
+        name=f'products:{params["sort"]}:{params["search"] is not None}')
+    page = paginator.page(params['cursor'])
+
+    return {
+        'products': page.object_list,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'current_categories': filtered['categories'],
+        'fuzzy_search': filtered['fuzzy_search'],
+    }
+
+
+def category_facets(facets, categories):
+    """
+    The counts shown on the category buttons. If the user has filtered
+    by category the counts are shown on those category buttons, else a
+    button is shown for every category in the results.
+    """
+    if categories is None:
+        return facets['categories']
+    category_counts = {
+        category['category_name']: category['count']
+        for category in facets['categories']}
+    return [{
+        'category_name': category.category_name,
+        'category_friendly_name': category.category_friendly_name,
+        'count': category_counts.get(category.category_name, 0),
+    } for category in categories]
+
+
+def listing_cache_key(params):
+    """Creating the cache key from the normalized listing parameters"""
+    encoded = json.dumps(params, sort_keys=True)
+    return f'products:listing:{hashlib.md5(encoded.encode()).hexdigest()}'
+
+
+def get_listing(params):
+    """
+    Returning the cached listing, building it if it is out of date,
+    along with the facet counts for its filters
+    """
+    # The filters are only run if the listing or the facet counts have
+    # to be built, and only once if both do
+    filtered = {}
+
+    def filter_once():
+        if not filtered:
+            filtered.update(filter_products(params))
+        return filtered
+
+    listing = dict(get_or_build(
+        listing_cache_key(params),
+        lambda: build_listing(params, filter_once()),
+        settings.LISTING_CACHE_TIMEOUT,
+        LISTING_VERSIONS.get(params['sort'], CATALOG)))
+
+    # Counting the filtered products in each category, price band and
+    # rating bucket with one grouped query, the product total is taken
+    # from the counts instead of counting the products again
+    facets = get_facets(
+        lambda: filter_once()['products'],
+        params['categories'], params['search'])
+    listing['product_total'] = product_count(facets)
+    listing['facets'] = facets
+    listing['category_facets'] = category_facets(
+        facets, listing['current_categories'])
+    return listing
@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import CATALOG_FIELDS, FORMATS, RowWriter, guess_format
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Exports every product to a CSV or JSON Lines file that can be
+    loaded again with catalog_import. The products are read from the
+    database in chunks with iterator(), so the whole catalogue is never
+    held in memory.
+    """
+    help = 'Export the products to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to export to, or - to write to stdout')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='File format, worked out from the file name if not given')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of products read from the database at a time')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+
+        if path == '-':
+            exported = self._export(
+                sys.stdout, file_format, options['batch_size'])
+        else:
+            try:
+                with open(path, 'w', newline='', encoding='utf-8') as stream:
+                    exported = self._export(
+                        stream, file_format, options['batch_size'])
+            except OSError as error:
+                raise CommandError(f'Cannot write {path}: {error}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Exported {exported} products to {path}'))
+
+    def _export(self, stream, file_format, batch_size):
+        writer = RowWriter(stream, file_format)
+        fields = [field for field in CATALOG_FIELDS if field != 'category']
+        products = Product.objects.order_by('pk').values_list(
+            *fields, 'category__category_name')
+        exported = 0
+        for values in products.iterator(chunk_size=batch_size):
+            writer.write(dict(zip(CATALOG_FIELDS, values)))
+            exported += 1
+        return exported
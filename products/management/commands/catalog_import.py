@@ -0,0 +1,163 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from products import search
+from products.caching import PRICES, bump_version
+from products.catalog import (
+    FORMATS, CatalogError, guess_format, has_changed, parse_row, read_rows)
+from products.models import Category, Product
+
+# Product fields written by the import, every field in the file apart
+# from the sku that the products are matched by
+UPDATE_FIELDS = [
+    'product_name', 'product_description', 'product_price',
+    'product_rating', 'product_sizes', 'product_image_url',
+    'product_image', 'category_id', 'category_name',
+]
+
+
+class Command(BaseCommand):
+    """
+    Imports products from a CSV or JSON Lines file, updating the
+    products that already have the same sku and creating the rest.
+
+    The file is read a row at a time and the products are saved in
+    batches with bulk_create and bulk_update, so memory use stays the
+    same however big the file is. Categories are looked up by name from
+    a dictionary loaded once, and any new category names are created.
+    Products whose values have not changed are not saved again. A sku
+    in more than one row of a batch is reported, and the values from
+    its last row are used. A sku repeated in a later batch updates the
+    product saved for it by the earlier batch, so the last row is used
+    there too. Nothing is imported if the same sku is used by more than
+    one product, as its rows could not be matched to a single product.
+    Bulk saves do not send the product signals, so each batch is added
+    to the search index directly and the catalogue and prices versions
+    are bumped once at the end.
+    """
+    help = 'Import products from a CSV or JSON Lines file, matched by sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to import, or - to read from stdin')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='File format, worked out from the file name if not given')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of products saved in each batch')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        self.batch_size = options['batch_size']
+        self.categories = dict(
+            Category.objects.values_list('category_name', 'id'))
+        self.created = self.updated = self.unchanged = 0
+
+        duplicates = list(
+            Product.objects.exclude(sku__isnull=True).exclude(sku='')
+            .values('sku').annotate(products=Count('id'))
+            .filter(products__gt=1).values_list('sku', flat=True))
+        if duplicates:
+            raise CommandError(
+                'These skus are used by more than one product, give each '
+                'product its own sku before importing: '
+                + ', '.join(sorted(duplicates)))
+
+        # If the import stops part way the batches already saved are
+        # kept, so the catalogue version is bumped either way
+        try:
+            if path == '-':
+                self._import(sys.stdin, file_format)
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    self._import(stream, file_format)
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        except CatalogError as error:
+            raise CommandError(str(error))
+        finally:
+            bump_version()
+            bump_version(PRICES)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {self.created}, updated {self.updated} and left '
+            f'{self.unchanged} unchanged products'))
+
+    def _import(self, stream, file_format):
+        # Rows are kept by sku so a sku repeated in one batch is only
+        # saved once, with the values from its last row
+        batch = {}
+        skipped = 0
+        for number, row in enumerate(read_rows(stream, file_format), 1):
+            try:
+                fields = parse_row(row)
+            except CatalogError as error:
+                raise CatalogError(f'Row {number}: {error}') from error
+            if fields['sku'] is None:
+                skipped += 1
+                continue
+            if fields['sku'] in batch:
+                self.stderr.write(
+                    f'Row {number}: Sku {fields["sku"]} is repeated, '
+                    'the last row is used')
+            batch[fields['sku']] = fields
+            if len(batch) >= self.batch_size:
+                self._save(batch)
+                batch = {}
+        if batch:
+            self._save(batch)
+        if skipped:
+            self.stderr.write(f'Skipped {skipped} rows without a sku')
+
+    def _category_id(self, name):
+        """Looking up a category id by name, creating the category if new"""
+        if name is None:
+            return None
+        if name not in self.categories:
+            category = Category.objects.create(
+                category_name=name,
+                category_friendly_name=name.replace('_', ' ').title())
+            self.categories[name] = category.id
+        return self.categories[name]
+
+    def _save(self, batch):
+        with transaction.atomic():
+            # Loading the current values of the products in the batch,
+            # so products that have not changed are not written again
+            existing = {
+                product['sku']: product
+                for product in Product.objects.filter(
+                    sku__in=batch).values('id', 'sku', *UPDATE_FIELDS)}
+            to_create = []
+            to_update = []
+            for sku, fields in batch.items():
+                fields = dict(fields)
+                # Bulk saves do not send the signal that keeps the
+                # category name on the product, so it is set here
+                fields['category_name'] = fields['category'] or ''
+                fields['category_id'] = self._category_id(
+                    fields.pop('category'))
+                current = existing.get(sku)
+                if current is None:
+                    to_create.append(Product(**fields))
+                elif has_changed(current, fields, UPDATE_FIELDS):
+                    to_update.append(Product(id=current['id'], **fields))
+            Product.objects.bulk_create(to_create)
+            Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+
+            # Created products only get an id once they are saved, so
+            # their ids are read back by sku for the search index
+            changed = [product.id for product in to_update]
+            if to_create:
+                changed += Product.objects.filter(sku__in=[
+                    product.sku for product in to_create]).values_list(
+                        'id', flat=True)
+            search.index_products(changed)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        self.unchanged += len(batch) - len(to_create) - len(to_update)
@@ -0,0 +1,190 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from products.facets import facet_rows
+from products.fuzzy import fuzzy_search_products
+from products.listing import PRODUCT_SORT_KEYS, filter_products
+from products.models import Category, Product, Review
+from products.pagination import KeysetPaginator
+from products.search import search_terms
+
+# The kinds of query checked. A page of products may walk an index in
+# its sort order, as it stops after one page. The products found by a
+# search are sorted after they are found, as the search index decides
+# which rows are read. Counts have to read only the rows they count,
+# apart from the counts of every product, which read every product from
+# a covering index instead of the product rows.
+PAGE = 'page'
+SEARCH = 'search'
+COUNTS = 'counts'
+WHOLE = 'whole'
+
+# Plan lines that read a table or index from the start on SQLite,
+# SQLite sorting the rows itself, and a constrained read of the search
+# index, such as VIRTUAL TABLE INDEX 0:M3
+SQLITE_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)')
+SQLITE_ORDER_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+SQLITE_COVERING_INDEX = 'USING COVERING INDEX'
+SQLITE_SEARCH_INDEX = re.compile(r'VIRTUAL TABLE INDEX \d+:\S')
+POSTGRES_SCAN = 'Seq Scan'
+POSTGRES_SORT = 'Sort Key'
+
+
+class Command(BaseCommand):
+    """
+    Runs EXPLAIN on the queries behind the products page, the product
+    details page and the product reviews, and fails if any of them has
+    to read a whole table, or sorts rows the listing could have read in
+    order from an index.
+
+    Each sort is checked in both directions for the first page and for
+    a later page using a cursor, for all products, one category and a
+    search. The facet counts are checked for all products, one category
+    and a search, along with the close match search used when a search
+    finds nothing. Filtering by several categories sorts the products of
+    those categories, as one index cannot give them in order.
+    """
+    help = 'Check the catalogue queries use indexes instead of table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Update the planner statistics before checking the plans')
+
+    def handle(self, *args, **options):
+        # Without statistics the planner can choose a different plan to
+        # the one it uses on a database that has been analyzed
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        failures = []
+        checked = 0
+        for label, queryset, kind in self._queries():
+            plan = self._explain(queryset)
+            checked += 1
+            if self._reads_table(queryset, plan, kind):
+                failures.append(f'{label}:\n{plan}')
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'{label}:\n{plan}\n')
+
+        if failures:
+            raise CommandError(
+                'These queries read a whole table or sort it:\n\n'
+                + '\n\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'All {checked} catalogue queries use an index'))
+
+    def _queries(self):
+        """Yielding a label, queryset and kind for each query to check"""
+        category = Category.objects.order_by('category_name').first()
+        product = Product.objects.order_by('pk').first()
+        filters = [('all products', {}, PAGE)]
+        if category is not None:
+            filters.append((
+                f'category {category.category_name}',
+                {'categories': [category.category_name]}, PAGE))
+        if product is not None:
+            # Searching for the first word of a product name, so the
+            # search finds at least one product
+            term = search_terms(product.product_name)[0]
+            filters.append((f'search {term}', {'search': term}, SEARCH))
+
+        sorts = [(None, [])] + [
+            (sort, [key]) for sort, key in PRODUCT_SORT_KEYS.items()]
+        for filter_label, params, kind in filters:
+            filtered = filter_products(
+                dict({'categories': None, 'search': None}, **params))
+            queryset = filtered['products']
+            for sort, keys in sorts:
+                for descending in (False, True):
+                    if sort is None and descending:
+                        continue
+                    if sort is None and kind == SEARCH:
+                        # Searches are shown best match first by default
+                        label = f'{filter_label}, sorted by best match'
+                        keys = ['search_rank']
+                        descending = True
+                    else:
+                        label = (
+                            f'{filter_label}, sorted by {sort or "id"}'
+                            f'{" descending" if descending else ""}')
+                    yield from self._page_queries(
+                        label, queryset, keys, descending, kind)
+
+            counts_kind = WHOLE if filter_label == 'all products' else COUNTS
+            yield (f'{filter_label}, facet counts', facet_rows(queryset),
+                   counts_kind)
+
+        if product is not None:
+            # A misspelt product name, found by the close match search
+            name = product.product_name
+            products = Product.objects.select_related('category').defer(
+                'product_description')
+            yield (f'close matches for {name[1:]}',
+                   fuzzy_search_products(products, name[1:]).order_by(
+                       '-search_rank', 'pk'), SEARCH)
+
+            # The product details page and its reviews, newest first
+            yield ('product details',
+                   Product.objects.filter(pk=product.pk), PAGE)
+            yield ('product reviews',
+                   Review.objects.filter(product=product.pk).order_by(
+                       '-date_created', '-time_created'), PAGE)
+
+    def _page_queries(self, label, queryset, keys, descending, kind):
+        """The first page of a listing and the page after its first row"""
+        paginator = KeysetPaginator(queryset, keys, descending=descending)
+        ordering = paginator.ordering()
+        first_page = paginator.queryset.order_by(*ordering)
+        yield (f'{label}, first page', first_page[:paginator.per_page + 1],
+               kind)
+
+        row = first_page.first()
+        if row is not None:
+            values = [getattr(row, field) for field in paginator.fields]
+            later_page = paginator.queryset.filter(
+                paginator.seek(values)).order_by(*ordering)
+            yield (f'{label}, later page',
+                   later_page[:paginator.per_page + 1], kind)
+
+    def _explain(self, queryset):
+        """
+        Returning the query plan. PostgreSQL will still choose a Seq
+        Scan on a small table even when there is a usable index, so
+        sequential scans are turned off to show if an index exists.
+        """
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
+
+    def _reads_table(self, queryset, plan, kind):
+        if connection.vendor == 'postgresql':
+            if POSTGRES_SCAN in plan:
+                return True
+            return kind == PAGE and POSTGRES_SORT in plan
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                f'Query plans cannot be checked on {connection.vendor}')
+
+        sorted_afterwards = SQLITE_ORDER_SORT in plan
+        if sorted_afterwards and kind != SEARCH:
+            return True
+        # A page that is read in order from an index, without being
+        # sorted afterwards, stops after one page of rows
+        walks_in_order = (
+            kind in (PAGE, SEARCH) and not sorted_afterwards
+            and queryset.query.high_mark is not None)
+        for line in plan.splitlines():
+            if SQLITE_SCAN.search(line) is None:
+                continue
+            if SQLITE_SEARCH_INDEX.search(line) or walks_in_order:
+                continue
+            if kind == WHOLE and SQLITE_COVERING_INDEX in line:
+                continue
+            return True
+        return False
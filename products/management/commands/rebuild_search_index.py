@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products import search
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the product search index from the products table, for use
+    after bulk changes to the products that do not send signals.
+    """
+    help = 'Rebuild the full text product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='Database alias to rebuild the search index on')
+
+    def handle(self, *args, **options):
+        search.rebuild_index(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from products.caching import RATINGS, bump_version
+from products.models import Product, Review
+
+# Review totals fields that are recomputed on every product
+TOTAL_FIELDS = [
+    'review_count', 'review_rating_sum', 'review_rating_average',
+    'review_count_1', 'review_count_2', 'review_count_3',
+    'review_count_4', 'review_count_5',
+]
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the review totals on every product from the reviews
+    table, for backfilling the totals or fixing them if they drift.
+    The reviews are totalled with one grouped query and the products
+    are then updated in batches.
+    """
+    help = 'Recompute the stored review totals for every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of products updated in each bulk update')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Totalling the reviews for every product in one query, with a
+        # filtered count for each star rating from 1 to 5
+        star_counts = {
+            'count_1': Count('id', filter=Q(review_rating__lt=2)),
+            'count_5': Count('id', filter=Q(review_rating__gte=5)),
+        }
+        for stars in range(2, 5):
+            star_counts[f'count_{stars}'] = Count('id', filter=Q(
+                review_rating__gte=stars, review_rating__lt=stars + 1))
+        totals = {
+            row['product']: row for row in Review.objects.values(
+                'product').order_by().annotate(
+                    count=Count('id'), total=Sum('review_rating'),
+                    **star_counts)
+        }
+
+        updated = 0
+        batch = []
+        products = Product.objects.only('id', *TOTAL_FIELDS).order_by('id')
+        for product in products.iterator(chunk_size=batch_size):
+            row = totals.get(product.id)
+            if row:
+                product.review_count = row['count']
+                product.review_rating_sum = row['total']
+                product.review_rating_average = row['total'] / row['count']
+                for stars in range(1, 6):
+                    setattr(product, f'review_count_{stars}',
+                            row[f'count_{stars}'])
+            else:
+                product.review_count = 0
+                product.review_rating_sum = 0
+                product.review_rating_average = None
+                for stars in range(1, 6):
+                    setattr(product, f'review_count_{stars}', 0)
+            batch.append(product)
+            if len(batch) >= batch_size:
+                updated += self._save(batch)
+                batch = []
+        if batch:
+            updated += self._save(batch)
+
+        # The rating counts and the rating sort use the review totals, so
+        # they are built again
+        bump_version(RATINGS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed review totals for {updated} products'))
+
+    def _save(self, batch):
+        with transaction.atomic():
+            Product.objects.bulk_update(batch, TOTAL_FIELDS)
+        return len(batch)
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creating the product search index, a FTS5 table for SQLite or a
+    tsvector column with a GIN index for Postgres, and filling it with
+    the products already in the database.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE "products_product_fts" USING fts5('
+            'product_name, product_description, '
+            'tokenize = \'porter unicode61\')')
+        schema_editor.execute(
+            'INSERT INTO "products_product_fts" '
+            '(rowid, product_name, product_description) '
+            'SELECT "id", "product_name", "product_description" '
+            'FROM "products_product"')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE "products_product" '
+            'ADD COLUMN "search_vector" tsvector')
+        schema_editor.execute(
+            'UPDATE "products_product" SET "search_vector" = '
+            'setweight(to_tsvector(\'english\', '
+            'coalesce("product_name", \'\')), \'A\') || '
+            'setweight(to_tsvector(\'english\', '
+            'coalesce("product_description", \'\')), \'B\')')
+        schema_editor.execute(
+            'CREATE INDEX "products_product_search_vector_gin" '
+            'ON "products_product" USING GIN ("search_vector")')
+
+
+def drop_search_index(apps, schema_editor):
+    """Removing the product search index"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS "products_product_fts"')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE "products_product" '
+            'DROP COLUMN IF EXISTS "search_vector"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_alter_product_product_sizes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.4 on 2026-10-17 10:17
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_review_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(
+                fields=['category_name'], name='category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['product_price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['review_rating_average', 'id'],
+                name='product_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                django.db.models.functions.text.Lower('product_name'),
+                django.db.models.expressions.F('id'),
+                name='product_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category', 'id'], name='product_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(
+                fields=[
+                    'product', '-date_created', '-time_created', '-id'],
+                name='review_product_newest_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+import products.models
+
+
+def empty_unreviewed_averages(apps, schema_editor):
+    """Products without any reviews have no average rating"""
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(review_count=0).update(review_rating_average=None)
+
+
+def zero_unreviewed_averages(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(review_rating_average=None).update(
+        review_rating_average=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_product_sku_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_rating_idx',
+        ),
+        # SQLite copies the table to change a column, which does not
+        # copy the lower case name index, so it is dropped and added
+        # again around the change
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_name_lower_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='review_rating_average',
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=3,
+                null=True),
+        ),
+        migrations.RunPython(
+            empty_unreviewed_averages, zero_unreviewed_averages),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                django.db.models.functions.text.Lower('product_name'),
+                django.db.models.expressions.F('id'),
+                name='product_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                products.models.RatingValue(
+                    'review_rating_average', 'product_rating',
+                    'review_rating_sum'),
+                django.db.models.expressions.F('id'),
+                name='product_rating_value_idx'),
+        ),
+    ]
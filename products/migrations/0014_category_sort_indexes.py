@@ -0,0 +1,51 @@
+# Generated by Django 3.2.4 on 2026-10-17 11:06
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+import products.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_rating_value_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category', 'product_price', 'id'],
+                name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                django.db.models.expressions.F('category'),
+                products.models.RatingValue(
+                    'review_rating_average', 'product_rating',
+                    'review_rating_sum'),
+                django.db.models.expressions.F('id'),
+                name='product_category_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                django.db.models.expressions.F('category'),
+                django.db.models.functions.text.Lower('product_name'),
+                django.db.models.expressions.F('id'),
+                name='product_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category', 'product_price', 'review_count',
+                        'review_rating_average'],
+                name='product_facets_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 3.2.4 on 2026-10-17 12:40
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+import products.models
+
+
+def set_category_names(apps, schema_editor):
+    """Keeping the category name on each product for the category sort"""
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    for category in Category.objects.all():
+        Product.objects.filter(category=category).update(
+            category_name=category.category_name)
+
+
+# The indexes on expressions, which SQLite cannot copy when it copies
+# the table to add a column, so they are dropped and added again
+# around the new column
+EXPRESSION_INDEXES = [
+    models.Index(
+        django.db.models.functions.text.Lower('product_name'),
+        django.db.models.expressions.F('id'),
+        name='product_name_lower_idx'),
+    models.Index(
+        products.models.RatingValue(
+            'review_rating_average', 'product_rating',
+            'review_rating_sum'),
+        django.db.models.expressions.F('id'),
+        name='product_rating_value_idx'),
+    models.Index(
+        django.db.models.expressions.F('category'),
+        products.models.RatingValue(
+            'review_rating_average', 'product_rating',
+            'review_rating_sum'),
+        django.db.models.expressions.F('id'),
+        name='product_category_rating_idx'),
+    models.Index(
+        django.db.models.expressions.F('category'),
+        django.db.models.functions.text.Lower('product_name'),
+        django.db.models.expressions.F('id'),
+        name='product_category_name_idx'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_category_sort_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.RemoveIndex(model_name='product', name=index.name)
+            for index in EXPRESSION_INDEXES
+        ],
+        migrations.AddField(
+            model_name='product',
+            name='category_name',
+            field=models.CharField(
+                blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.RunPython(set_category_names, migrations.RunPython.noop),
+        *[
+            migrations.AddIndex(model_name='product', index=index)
+            for index in EXPRESSION_INDEXES
+        ],
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category_name', 'id'],
+                name='product_category_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category', 'category_name', 'id'],
+                name='product_category_category_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.4 on 2026-10-17 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_product_category_name'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_facets_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=[
+                    'category', 'product_price', 'review_rating_average',
+                    'product_rating', 'review_rating_sum'],
+                name='product_facets_idx'),
+        ),
+    ]
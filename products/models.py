@@ -1,13 +1,39 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
 
 
+class RatingValue(Coalesce):
+    """
+    Coalesce giving a float. SQLite wraps decimal expressions in a cast,
+    which is added twice in an index, so the query would not match it.
+    """
+    output_field = models.FloatField()
+
+
+# The rating a product is shown with and sorted by, the average of its
+# reviews, or the rating it was given if it has no reviews yet. Products
+# with neither are sorted by their review rating total, which is 0.
+# There are no parameters or casts in the expression, so SQLite can
+# match it to its index.
+PRODUCT_RATING = RatingValue(
+    'review_rating_average', 'product_rating', 'review_rating_sum')
+
+
 class Category(models.Model):
 
     # Adding a meta class specifying a verbose name of categories
     # instead of Django default category name on the admin page
     class Meta:
         verbose_name_plural = 'Categories'
+        # Index for filtering the products page by category name
+        indexes = [
+            models.Index(
+                fields=['category_name'], name='category_name_idx'),
+        ]
 
     # Setting the programmatic name
     category_name = models.CharField(max_length=254)
@@ -33,8 +59,55 @@ class Product(models.Model):
     Null and Blank true have been used throughout the model
     fields to make them optional.
     """
+
+    # Indexes for each sort on the products page, every sort index ends
+    # with the id so the cursor pagination can seek straight to a page.
+    # The name sort uses lower case names, so it is a functional index
+    # on the lower case product name rather than the name itself. Each
+    # sort also has an index starting with the category for the products
+    # of one category, the category foreign key index already gives the
+    # products of a category in id order. The category sort uses the
+    # category name kept on each product, so it has an index of its own
+    # instead of joining the categories.
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product_price', 'id'], name='product_price_idx'),
+            models.Index(
+                PRODUCT_RATING, 'id', name='product_rating_value_idx'),
+            models.Index(
+                Lower('product_name'), 'id', name='product_name_lower_idx'),
+            models.Index(
+                fields=['category_name', 'id'],
+                name='product_category_sort_idx'),
+            models.Index(
+                fields=['category', 'product_price', 'id'],
+                name='product_category_price_idx'),
+            models.Index(
+                'category', PRODUCT_RATING, 'id',
+                name='product_category_rating_idx'),
+            models.Index(
+                'category', Lower('product_name'), 'id',
+                name='product_category_name_idx'),
+            models.Index(
+                fields=['category', 'category_name', 'id'],
+                name='product_category_category_idx'),
+            # The facet counts of all products are read from this index
+            # instead of the product rows
+            models.Index(
+                fields=[
+                    'category', 'product_price', 'review_rating_average',
+                    'product_rating', 'review_rating_sum'],
+                name='product_facets_idx'),
+            # The catalogue import matches products by their sku
+            models.Index(fields=['sku'], name='product_sku_idx'),
+        ]
     category = models.ForeignKey(
         'Category', null=True, blank=True, on_delete=models.SET_NULL)
+    # The name of the category, kept up to date by the product and
+    # category signals and empty for products without a category
+    category_name = models.CharField(
+        max_length=254, default='', blank=True, editable=False)
     product_name = models.CharField(max_length=254)
     product_description = models.TextField()
     product_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -47,9 +120,92 @@ class Product(models.Model):
     product_image_url = models.URLField(
         max_length=1024, null=True, blank=True)
 
+    # Review totals, these are kept up to date by the review signals
+    # so the rating sort and the review summary never need to count the
+    # reviews. There is one count for each star rating from 1 to 5.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    review_rating_sum = models.DecimalField(
+        max_digits=10, decimal_places=1, default=0, editable=False)
+    # The average is empty for products without any reviews
+    review_rating_average = models.DecimalField(
+        max_digits=3, decimal_places=2, null=True, blank=True,
+        editable=False)
+    review_count_1 = models.PositiveIntegerField(default=0, editable=False)
+    review_count_2 = models.PositiveIntegerField(default=0, editable=False)
+    review_count_3 = models.PositiveIntegerField(default=0, editable=False)
+    review_count_4 = models.PositiveIntegerField(default=0, editable=False)
+    review_count_5 = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.product_name
 
+    def review_histogram(self):
+        """
+        Returning the number of reviews for each star rating from 5 down
+        to 1, along with the percentage of all reviews they make up
+        """
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'review_count_{stars}')
+            percent = round(count * 100 / self.review_count) \
+                if self.review_count else 0
+            histogram.append(
+                {'stars': stars, 'count': count, 'percent': percent})
+        return histogram
+
+    def update_review_totals(self, added=None, removed=None):
+        """
+        Updating the review totals when a review is added, removed or
+        its rating is changed, using F expressions so the change is made
+        in a single update without reading the totals first. Added and
+        removed are the review ratings that have been added or removed.
+        """
+        count_change = 0
+        sum_change = Decimal(0)
+        buckets = {}
+        if added is not None:
+            count_change += 1
+            sum_change += added
+            stars = review_stars(added)
+            buckets[stars] = buckets.get(stars, 0) + 1
+        if removed is not None:
+            count_change -= 1
+            sum_change -= removed
+            stars = review_stars(removed)
+            buckets[stars] = buckets.get(stars, 0) - 1
+
+        new_count = F('review_count') + count_change
+        new_sum = F('review_rating_sum') + sum_change
+        # The average is worked out from the new totals, unless the last
+        # review has been removed when the average is emptied. The
+        # sum is multiplied by 1.0 so SQLite, which stores whole numbers
+        # in decimal columns as integers, does not round the division.
+        average = Case(
+            When(review_count=-count_change, then=Value(None)),
+            default=ExpressionWrapper(
+                new_sum * Value(Decimal('1.0')) / new_count,
+                output_field=models.DecimalField()),
+            output_field=models.DecimalField())
+
+        updates = {
+            'review_count': new_count,
+            'review_rating_sum': new_sum,
+            'review_rating_average': average,
+        }
+        for stars, change in buckets.items():
+            if change:
+                field = f'review_count_{stars}'
+                updates[field] = F(field) + change
+        Product.objects.filter(pk=self.pk).update(**updates)
+
+
+def review_stars(rating):
+    """
+    Returning the whole star rating from 1 to 5 a review rating is
+    counted under, so a 4.5 rating is counted as 4 stars
+    """
+    return min(max(int(rating), 1), 5)
+
 
 class Review(models.Model):
     """
@@ -67,5 +223,13 @@ class Review(models.Model):
     date_created = models.DateField(auto_now_add=True)
     time_created = models.TimeField(auto_now_add=True)
 
+    # Index for showing a products reviews newest first
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product', '-date_created', '-time_created', '-id'],
+                name='review_product_newest_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
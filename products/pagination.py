@@ -0,0 +1,166 @@
+"""
+Keyset (cursor) pagination for querysets.
+
+Instead of using an offset, each page remembers the sort values of its
+first and last rows in a signed cursor, and the next page is read with a
+WHERE clause that continues from those values. With an index on the sort
+columns every page costs the same to load however deep the user goes.
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by one or more sort keys with the primary key
+    added on the end as a tiebreaker, so every row has a unique position.
+    Sort keys can be field names or expressions, expressions are
+    annotated onto the queryset so they can be used in the cursor filter.
+    The name is used to sign the cursors, so a cursor from one sort order
+    cannot be used with another.
+    """
+
+    def __init__(self, queryset, keys, descending=False, per_page=24,
+                 name='keyset'):
+        self.fields = []
+        annotations = {}
+        for index, key in enumerate(keys):
+            if isinstance(key, str):
+                self.fields.append(key)
+            else:
+                field = f'keyset_{index}'
+                annotations[field] = key
+                self.fields.append(field)
+        self.fields.append('pk')
+        self.queryset = queryset.annotate(**annotations)
+        self.descending = descending
+        self.per_page = per_page
+        self.salt = f'{name}:{",".join(self.fields)}:{int(descending)}'
+
+    @cached_property
+    def count(self):
+        """Total number of rows in the queryset using a single COUNT"""
+        return self.queryset.order_by().count()
+
+    def page(self, cursor=None):
+        """Return the page for a cursor, or the first page if no cursor"""
+        return KeysetPage(self, self.decode_cursor(cursor))
+
+    def encode_cursor(self, row, backwards):
+        """Creating a signed cursor from the sort values of a row"""
+        values = [str(getattr(row, field)) for field in self.fields]
+        return signing.dumps([int(backwards), values], salt=self.salt)
+
+    def decode_cursor(self, cursor):
+        """
+        Reading a cursor back into its direction and sort values, an
+        invalid or tampered cursor is ignored and gives the first page.
+        """
+        if not cursor:
+            return None
+        try:
+            backwards, values = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if len(values) != len(self.fields):
+            return None
+        return bool(backwards), values
+
+    def ordering(self, backwards=False):
+        """The order by fields for reading forwards or backwards"""
+        descending = self.descending != backwards
+        return [f'-{field}' if descending else field
+                for field in self.fields]
+
+    def seek(self, values, backwards=False):
+        """
+        Building the filter for the rows that come after the cursor
+        values in the reading direction, this is the expanded form of a
+        (a, b, id) > (x, y, z) row comparison. The extra a >= x bound on
+        the first field (a <= x when reading descending) lets the database
+        seek straight to the cursor in the sort index instead of reading
+        the index from the start.
+        """
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        condition = Q(**{f'{self.fields[-1]}__{lookup}': values[-1]})
+        for index in range(len(self.fields) - 2, -1, -1):
+            field = self.fields[index]
+            condition = Q(**{f'{field}__{lookup}': values[index]}) | (
+                Q(**{field: values[index]}) & condition)
+        if len(self.fields) > 1:
+            condition &= Q(**{f'{self.fields[0]}__{lookup}e': values[0]})
+        return condition
+
+
+class KeysetPage:
+    """
+    A single page of rows. The rows are only loaded from the database
+    the first time the page is used, so a page that is never rendered
+    never runs a query.
+    """
+
+    def __init__(self, paginator, position):
+        self.paginator = paginator
+        self.position = position
+
+    @cached_property
+    def _result(self):
+        paginator = self.paginator
+        per_page = paginator.per_page
+        backwards = False
+        queryset = paginator.queryset
+        if self.position:
+            backwards, values = self.position
+            queryset = queryset.filter(paginator.seek(values, backwards))
+        rows = list(queryset.order_by(
+            *paginator.ordering(backwards))[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if backwards:
+            # If there is nothing before these rows we are back at the
+            # start, so show a full first page instead of a short one
+            if not has_more:
+                return KeysetPage(paginator, None)._result
+            rows.reverse()
+            return rows, True, True
+        return rows, self.position is not None, has_more
+
+    @property
+    def object_list(self):
+        return self._result[0]
+
+    @property
+    def has_previous(self):
+        return self._result[1]
+
+    @property
+    def has_next(self):
+        return self._result[2]
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.paginator.encode_cursor(
+                self.object_list[-1], backwards=False)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.encode_cursor(
+                self.object_list[0], backwards=True)
+        return None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
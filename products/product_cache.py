@@ -0,0 +1,107 @@
+"""
+Products kept in memory by each worker for the trolley and checkout.
+
+The trolley pages, the trolley API, checkout and the Stripe webhook all
+need the same few products to read their name, price and image. Each
+worker keeps the products it has loaded in a least recently used cache,
+so popular products are only read from the database once for each
+catalogue version. Once the cache holds PRODUCT_CACHE_SIZE products the
+least recently used one is dropped for each new one.
+
+The catalogue and prices versions are checked with a VersionCheck, so
+the whole cache is emptied within a few seconds of any product changing,
+without a cache lookup each time products are asked for. Until then the
+products can have their old prices, so anything worked out from their
+prices is stamped with prices_version, the version the products were
+loaded under, rather than the current prices version. Only the fields the
+trolley, checkout and webhook use are loaded, leaving out the product
+description. The products returned are shared between requests and
+must not be changed or saved.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import Http404
+
+from .caching import CATALOG, PRICES, VersionCheck
+from .models import Product
+
+# The fields loaded for each product kept in memory
+PRODUCT_FIELDS = (
+    'product_name', 'product_price', 'sku', 'product_sizes',
+    'product_image')
+
+
+class ProductCache:
+    """A least recently used cache of products by id"""
+
+    def __init__(self, max_size, version_name=(CATALOG, PRICES)):
+        self.max_size = max_size
+        self.version_check = VersionCheck(version_name)
+        self.lock = threading.Lock()
+        self.products = OrderedDict()
+        self.version = None
+
+    def get_many(self, product_ids):
+        """
+        Returning a dictionary of the products by id, the products that
+        are not in memory are loaded with one query. Products that do
+        not exist are left out.
+        """
+        product_ids = {int(product_id) for product_id in product_ids}
+        version = self.version_check.get()
+        found = {}
+        with self.lock:
+            if version != self.version:
+                self.products.clear()
+                self.version = version
+            for product_id in product_ids:
+                product = self.products.get(product_id)
+                if product is not None:
+                    self.products.move_to_end(product_id)
+                    found[product_id] = product
+
+        missing = product_ids.difference(found)
+        if not missing:
+            return found
+        loaded = Product.objects.only(*PRODUCT_FIELDS).in_bulk(missing)
+        with self.lock:
+            # Products loaded while the version changed are not kept,
+            # they may have been read before the change
+            if self.version == version:
+                self.products.update(loaded)
+                while len(self.products) > self.max_size:
+                    self.products.popitem(last=False)
+        found.update(loaded)
+        return found
+
+
+# This worker's cache of products
+_cache = ProductCache(settings.PRODUCT_CACHE_SIZE)
+
+
+def get_products(product_ids):
+    """The products with the given ids, by id"""
+    return _cache.get_many(product_ids)
+
+
+def prices_version():
+    """
+    The prices version of the products this worker keeps in memory. It
+    is read before the products are asked for, so a price that changes
+    in between makes anything worked out from them out of date.
+    """
+    return _cache.version_check.get()[1]
+
+
+def get_product_or_404(product_id):
+    """The product with the given id, raising Http404 if there is none"""
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        raise Http404('No product matches the given query.')
+    product = _cache.get_many([product_id]).get(product_id)
+    if product is None:
+        raise Http404('No product matches the given query.')
+    return product
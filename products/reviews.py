@@ -0,0 +1,100 @@
+"""
+Loading and caching the reviews shown on the product details page.
+
+Reviews are shown a page at a time, newest first, using a cursor. The
+review rows and the rendered review block are cached for each product
+against a review version for that product, which is bumped whenever one
+of its reviews is created, edited or deleted.
+"""
+import hashlib
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .caching import bump_version, get_or_build
+from .models import Review
+from .pagination import KeysetPaginator
+
+# The review columns the review block uses, the user is joined in for
+# the username so there is no extra query for each review
+REVIEW_FIELDS = (
+    'id', 'product_id', 'user_id', 'user__username', 'review_title',
+    'review_rating', 'review_message', 'date_created', 'time_created',
+)
+
+
+def review_version_name(product_id):
+    """The name of the version the product's cached reviews are built from"""
+    return f'reviews:{product_id}'
+
+
+def bump_review_version(product_id):
+    """Making the product's cached reviews out of date"""
+    return bump_version(review_version_name(product_id))
+
+
+def review_paginator(product_id):
+    """Paginating a product's reviews newest first"""
+    reviews = Review.objects.filter(product=product_id).select_related(
+        'user').only(*REVIEW_FIELDS)
+    return KeysetPaginator(
+        reviews, ['date_created', 'time_created'], descending=True,
+        per_page=settings.REVIEWS_PER_PAGE, name='reviews')
+
+
+def build_review_page(product_id, cursor):
+    """Loading one page of a product's reviews"""
+    page = review_paginator(product_id).page(cursor)
+    return {
+        'reviews': page.object_list,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def _review_url(product_id, cursor):
+    """Creating the link to a page of reviews on the product details page"""
+    url = reverse('product_details', args=[product_id])
+    if cursor:
+        url = f'{url}?reviews={cursor}'
+    return f'{url}#product-reviews'
+
+
+def get_review_block(product, cursor, user):
+    """
+    Returning the rendered review block for a page of a product's
+    reviews. The edit and delete buttons are only shown on the user's
+    own reviews, so the cached block is shared by every user who has no
+    reviews on the page and a separate block is cached for the rest.
+    """
+    version_name = review_version_name(product.id)
+    cursor = cursor or ''
+    digest = hashlib.md5(cursor.encode()).hexdigest()
+    key = f'products:reviews:{product.id}:{digest}'
+
+    review_page = get_or_build(
+        key, lambda: build_review_page(product.id, cursor),
+        settings.REVIEWS_CACHE_TIMEOUT, version_name)
+
+    owned_reviews = []
+    if user.is_authenticated:
+        owned_reviews = [review.id for review in review_page['reviews']
+                         if review.user_id == user.id]
+
+    def render_block():
+        return render_to_string(
+            'products/includes/product_reviews.html', {
+                'product': product,
+                'reviews': review_page['reviews'],
+                'owned_reviews': owned_reviews,
+                'next_url': review_page['next_cursor'] and _review_url(
+                    product.id, review_page['next_cursor']),
+                'previous_url': review_page['previous_cursor'] and _review_url(
+                    product.id, review_page['previous_cursor']),
+            })
+
+    owned = ','.join(str(review_id) for review_id in owned_reviews)
+    return get_or_build(
+        f'{key}:html:{owned}', render_block,
+        settings.REVIEWS_CACHE_TIMEOUT, version_name)
@@ -0,0 +1,181 @@
+"""
+Full text product search used by the all products page.
+
+On SQLite the product name and description are copied into an FTS5
+virtual table, and on Postgres they are stored in a tsvector column
+with a GIN index. Both are created by migration 0009 and kept up to
+date by the product signals, so a search only reads the matching rows
+from the index instead of scanning every product description.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Name of the SQLite FTS5 table and the Postgres tsvector column
+SEARCH_TABLE = 'products_product_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+# Postgres text search config and the weights given to the product name
+# and description, so a match in the name ranks higher than the description
+SEARCH_CONFIG = 'english'
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(product_name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(product_description, '')), "
+    "'B')")
+FTS_NAME_WEIGHT = 10.0
+FTS_DESCRIPTION_WEIGHT = 1.0
+
+# Number of products indexed by each statement when indexing in bulk
+INDEX_BATCH_SIZE = 500
+
+# Only plain words are passed to the search index, this stops users
+# typing in search operators or quotes that would break the query
+WORD_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """Split the users search query into lower case words"""
+    return WORD_RE.findall(query.lower())
+
+
+def search_products(products, query):
+    """
+    Filter the products queryset down to the products matching the
+    search query, annotated with a search_rank where a higher number
+    is a better match. Every word in the query has to match and the
+    last word is treated as a prefix, so "hood" will find hoodies.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return products.none()
+
+    vendor = connections[products.db].vendor
+
+    if vendor == 'sqlite':
+        # Joining the FTS5 table on the product id, bm25 returns a
+        # negative score so it is flipped to keep higher as better
+        match = ' '.join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        rank = RawSQL(
+            f'-bm25("{SEARCH_TABLE}", %s, %s)',
+            (FTS_NAME_WEIGHT, FTS_DESCRIPTION_WEIGHT),
+            output_field=FloatField())
+        return products.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f'"{SEARCH_TABLE}".rowid = "products_product"."id"',
+                f'"{SEARCH_TABLE}" MATCH %s',
+            ],
+            params=[match],
+        ).annotate(search_rank=rank)
+
+    if vendor == 'postgresql':
+        # Every word is joined with & and the last word gets a :* prefix
+        # match, the words only contain \w characters so they are safe
+        # to use inside to_tsquery
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        rank = RawSQL(
+            f'ts_rank("products_product"."{SEARCH_VECTOR_COLUMN}", '
+            f'to_tsquery(%s, %s))',
+            (SEARCH_CONFIG, tsquery),
+            output_field=FloatField())
+        return products.extra(
+            where=[
+                f'"products_product"."{SEARCH_VECTOR_COLUMN}" @@ '
+                f'to_tsquery(%s, %s)',
+            ],
+            params=[SEARCH_CONFIG, tsquery],
+        ).annotate(search_rank=rank)
+
+    # Any other database falls back to the original case insensitive
+    # search, every product found gets the same rank
+    queries = Q(product_name__icontains=query) | Q(
+        product_description__icontains=query)
+    return products.filter(queries).annotate(
+        search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_product(product, using='default'):
+    """Add or refresh a single product in the search index"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s',
+                [product.pk])
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" '
+                f'(rowid, product_name, product_description) '
+                f'VALUES (%s, %s, %s)',
+                [product.pk, product.product_name,
+                 product.product_description])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'UPDATE "products_product" SET '
+                f'"{SEARCH_VECTOR_COLUMN}" = {PG_SEARCH_VECTOR} '
+                f'WHERE "id" = %s', [product.pk])
+
+
+def index_products(product_ids, using='default'):
+    """
+    Add or refresh many products in the search index, this is used by
+    bulk changes that do not send signals. The ids are indexed in
+    batches to stay under the database's limit on query parameters.
+    """
+    connection = connections[using]
+    product_ids = list(product_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_ids), INDEX_BATCH_SIZE):
+            batch = product_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    f'DELETE FROM "{SEARCH_TABLE}" '
+                    f'WHERE rowid IN ({placeholders})', batch)
+                cursor.execute(
+                    f'INSERT INTO "{SEARCH_TABLE}" '
+                    f'(rowid, product_name, product_description) '
+                    f'SELECT "id", "product_name", "product_description" '
+                    f'FROM "products_product" '
+                    f'WHERE "id" IN ({placeholders})', batch)
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'UPDATE "products_product" SET '
+                    f'"{SEARCH_VECTOR_COLUMN}" = {PG_SEARCH_VECTOR} '
+                    f'WHERE "id" IN ({placeholders})', batch)
+
+
+def unindex_product(product_id, using='default'):
+    """
+    Remove a deleted product from the search index, the Postgres
+    column is removed along with the product row so only SQLite
+    needs to do anything here.
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s',
+                [product_id])
+
+
+def rebuild_index(using='default'):
+    """
+    Rebuild the whole search index from the products table, this is
+    used by the migration and after bulk changes that skip signals.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" '
+                f'(rowid, product_name, product_description) '
+                f'SELECT "id", "product_name", "product_description" '
+                f'FROM "products_product"')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'UPDATE "products_product" SET '
+                f'"{SEARCH_VECTOR_COLUMN}" = {PG_SEARCH_VECTOR}')
@@ -0,0 +1,143 @@
+# Importing the pre_save, post_save and post_delete signals,
+# also importing a receiver for the signals
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete)
+from django.dispatch import receiver
+
+# Importing Product, Category and Review to listen out for the signals
+from .models import Product, Category, Review
+from .caching import PRICES, RATINGS, bump_version
+from .reviews import bump_review_version
+from . import search
+
+
+@receiver(post_save, sender=Product)
+def index_on_save(sender, instance, using, **kwargs):
+    """
+    This function adds or refreshes the product in the search index
+    each time a product is created or updated, including products
+    loaded from the fixtures.
+    """
+    search.index_product(instance, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_on_delete(sender, instance, using, **kwargs):
+    """
+    Removing a deleted product from the search index
+    """
+    search.unindex_product(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, **kwargs):
+    """
+    Any change to a product or category bumps the catalogue version,
+    so the cached products page listings are rebuilt on the next visit
+    """
+    bump_version()
+
+
+@receiver(pre_save, sender=Product)
+def set_category_name(sender, instance, **kwargs):
+    """
+    Keeping the category name on the product for the category sort,
+    including products loaded from the fixtures
+    """
+    name = None
+    if instance.category_id is not None:
+        name = Category.objects.filter(pk=instance.category_id).values_list(
+            'category_name', flat=True).first()
+    instance.category_name = name or ''
+
+
+@receiver(post_save, sender=Category)
+def rename_category_products(sender, instance, created, **kwargs):
+    """Giving the products of a renamed category its new name"""
+    if not created:
+        Product.objects.filter(category=instance).exclude(
+            category_name=instance.category_name).update(
+                category_name=instance.category_name)
+
+
+@receiver(pre_delete, sender=Category)
+def clear_category_name(sender, instance, **kwargs):
+    """
+    Emptying the category name of the products of a deleted category,
+    which are left without a category
+    """
+    Product.objects.filter(category=instance).update(category_name='')
+
+
+@receiver(pre_save, sender=Product)
+def bump_prices_version_on_price_change(sender, instance, **kwargs):
+    """
+    Bumping the prices version when a product price changes, so the
+    trolley summaries stored in the sessions are worked out again
+    """
+    if instance.pk is None:
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list(
+        'product_price', flat=True).first()
+    if previous is not None and previous != instance.product_price:
+        bump_version(PRICES)
+
+
+@receiver(post_delete, sender=Product)
+def bump_prices_version_on_delete(sender, **kwargs):
+    """
+    Bumping the prices version when a product is deleted, so any
+    trolley with the product in it is worked out again without it
+    """
+    bump_version(PRICES)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """
+    Remembering the rating an edited review had before it is saved,
+    so the product review totals can take the old rating off
+    """
+    instance.previous_rating = None
+    if instance.pk:
+        instance.previous_rating = Review.objects.filter(
+            pk=instance.pk).values_list('review_rating', flat=True).first()
+
+
+@receiver(post_save, sender=Review)
+def update_review_totals_on_save(sender, instance, created, **kwargs):
+    """
+    Adding a new review to the product review totals, or swapping
+    the old rating for the new one when a review is edited
+    """
+    # The product's cached reviews are rebuilt whatever changed
+    bump_review_version(instance.product_id)
+
+    product = Product(pk=instance.product_id)
+    previous = getattr(instance, 'previous_rating', None)
+    if created or previous is None:
+        product.update_review_totals(added=instance.review_rating)
+    elif previous != instance.review_rating:
+        product.update_review_totals(
+            added=instance.review_rating, removed=previous)
+    else:
+        return
+    # The rating counts and the rating sort use the review totals, so
+    # they are built again. The catalogue version is left alone, so the
+    # other cached listings and the product caches are kept.
+    bump_version(RATINGS)
+
+
+@receiver(post_delete, sender=Review)
+def update_review_totals_on_delete(sender, instance, **kwargs):
+    """
+    Taking a deleted review off the product review totals, reviews
+    deleted along with their product have nothing left to update
+    """
+    bump_review_version(instance.product_id)
+    Product(pk=instance.product_id).update_review_totals(
+        removed=instance.review_rating)
+    bump_version(RATINGS)
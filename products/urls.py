@@ -5,6 +5,8 @@ from . import views
 urlpatterns = [
     path('', views.all_products, name='products'),
     path('<int:product_id>/', views.product_details, name='product_details'),
+    path('suggestions/', views.search_suggestions,
+         name='search_suggestions'),
 
     # Add, edit and delete products
     path('add/', views.add_product, name='add_product'),
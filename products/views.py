@@ -1,67 +1,42 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q
-from django.db.models.functions import Lower
+from django.http import JsonResponse
 
 # This will stop non logged in users from gaining access
 # to certain urls
 from django.contrib.auth.decorators import login_required
 
-from .models import Product, Category, Review
+from .models import Product, Review
 from .forms import ProductForm, ReviewForm
+from .listing import listing_params, get_listing
+from .reviews import get_review_block
+from . import autocomplete
 
 
 def all_products(request):
     """
     A view to show all products on the products page,
     and this also includes sorting products and searching
-    for products.
+    for products. Products are shown a page at a time using
+    a cursor, and each page is cached until the catalogue changes.
     """
-    products = Product.objects.all()
     query = None
-    categories = None
     sort = None
     direction = None
 
     if request.GET:
-        # This block of code check to see if sort is in request.get
-        # then sets it to none and sortkey, then if a user sorts by name
-        # the sortkey will be renamed to lower_name. Then the current list
-        # is annotated with a new field.
+        # This block of code check to see if sort is in request.get and
+        # then checks to see if the direction is descending, these are
+        # used to show the current sort in the sort selector.
         if 'sort' in request.GET:
-            sortkey = request.GET['sort']
-            sort = sortkey
-            if sortkey == 'name':
-                sortkey = 'lower_name'
-                products = products.annotate(lower_name=Lower('name'))
-            # This is sort the categories by name instead of id
-            if sortkey == 'category':
-                sortkey = 'category__category_name'
-
-            # This block of code checks to see if direction is in
-            # request.get and checks to see if the direction is
-            # descending and then orders the products using the
-            # order by model method.
+            sort = request.GET['sort']
             if 'direction' in request.GET:
                 direction = request.GET['direction']
-                if direction == 'desc':
-                    sortkey = f'-{sortkey}'
-            products = products.order_by(sortkey)
-
-        # This block of code is checking if the request get exists,
-        # then splits the at the commas to make a list and uses that
-        # list to filter the products using the category name from the list
-        if 'category' in request.GET:
-            categories = request.GET['category'].split(',')
-            products = products.filter(category__category_name__in=categories)
-            categories = Category.objects.filter(category_name__in=categories)
-
-    # This block of code is checking if the request get exists
-    # and uses the search bar name search and assigns to var query
-    # so that it can be used to search for a product within the
-    # products db. A error message will display if no search word has
-    # been entered and redirected back to the products page.
-    if request.GET:
+
+        # This block of code is checking if the request get exists
+        # and uses the search bar name search and assigns to var query.
+        # A error message will display if no search word has
+        # been entered and redirected back to the products page.
         if 'search' in request.GET:
             query = request.GET['search']
             if not query:
@@ -69,22 +44,30 @@ def all_products(request):
                     request, "Please type something to search")
                 return redirect(reverse('products'))
 
-            # This block of code uses the user search query and finds
-            # a match to the search query in both the
-            # product name and description which is case insensitive
-            queries = Q(product_name__icontains=query) | Q(
-                product_description__icontains=query)
-            products = products.filter(queries)
-            # This checks the search query length and if zero a error toast
-            # message will inform user no results found
-            if len(products) == 0:
-                messages.error(
-                    request, 'No search results founds')
-            else:
-                # else if search query length is not zero a success toast
-                # message will inform user about there search results
-                messages.success(
-                    request, f'{len(products)}: Results found for ({query})')
+    # Getting the page of products for the sort, category and search
+    # from the cache, or running the queries if it is not cached
+    params = listing_params(request.GET)
+    listing = get_listing(params)
+
+    # The search result toast message is only shown on the first page
+    if query is not None and not params['cursor']:
+        # This checks the search result count and if zero a error toast
+        # message will inform user no results found
+        if listing['product_total'] == 0:
+            messages.error(
+                request, 'No search results founds')
+        elif listing.get('fuzzy_search'):
+            # If the search only found close matches the toast message
+            # lets the user know these are similar products
+            messages.success(
+                request,
+                f'{listing["product_total"]}: Results similar to ({query})')
+        else:
+            # else if search result count is not zero a success toast
+            # message will inform user about there search results
+            messages.success(
+                request,
+                f'{listing["product_total"]}: Results found for ({query})')
 
     current_sorting = f'{sort}_{direction}'
 
@@ -92,15 +75,48 @@ def all_products(request):
     # used in the rendered html template
     template = 'products/products.html'
     context = {
-        'products': products,
+        'products': listing['products'],
+        'product_total': listing['product_total'],
+        'next_page_url': _page_url(request, listing['next_cursor']),
+        'previous_page_url': _page_url(
+            request, listing['previous_cursor']),
         'product_search': query,
-        'current_categories': categories,
-        'current_sorting': current_sorting
+        'current_categories': listing['current_categories'],
+        'current_sorting': current_sorting,
+        'category_facets': listing['category_facets'],
+        'facets': listing['facets'],
     }
 
     return render(request, template, context)
 
 
+def _page_url(request, cursor):
+    """
+    Creating the url for another page of products by keeping the current
+    sort, category and search get parameters and swapping the cursor
+    """
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def search_suggestions(request):
+    """
+    A view to return the product name suggestions for what has been
+    typed into the search box so far. The suggestions come from a prefix
+    index kept in memory, so this view does not query the database.
+    """
+    suggestions = [{
+        'name': name,
+        'url': reverse('product_details', args=[product_id]),
+    } for name, product_id in autocomplete.complete(
+        request.GET.get('q', '')[:100])]
+
+    return JsonResponse({'suggestions': suggestions})
+
+
 def product_details(request, product_id):
     """
     A view to show individual product details
@@ -109,16 +125,17 @@ def product_details(request, product_id):
     # Getting products
     product = get_object_or_404(Product, pk=product_id)
 
-    # Getting reviews and filtering by product id and
-    # ordering by new review using date and time
-    reviews = Review.objects.filter(
-        product=product_id).order_by('-date_created', '-time_created')
+    # Getting a page of reviews for the product, newest first, using
+    # the reviews cursor from the older and newer reviews buttons. The
+    # rendered reviews are cached until a review on the product changes.
+    review_block = get_review_block(
+        product, request.GET.get('reviews'), request.user)
     form = ReviewForm(request.POST)
 
     template = 'products/product_details.html'
     context = {
         'product': product,
-        'reviews': reviews,
+        'review_block': review_block,
         'form': form,
     }
 
@@ -22,4 +22,32 @@ $(document).ready(function () {
         $('html, body').scrollTop(0);
     });
 
+    //This block of code is for the search box suggestions, so when a user types
+    //into a search box the product names starting with what they have typed are
+    //fetched and shown under the search box. The request is only sent once the
+    //user stops typing for a moment and older replies are ignored.
+    let suggestionTimer = null;
+    let suggestionRequest = 0;
+    $('input[data-suggestions-url]').on('input', function () {
+        let searchBox = $(this);
+        let query = searchBox.val().trim();
+        clearTimeout(suggestionTimer);
+        if (!query) {
+            $('#search-suggestions').empty();
+            return;
+        }
+        suggestionTimer = setTimeout(function () {
+            let requestNumber = ++suggestionRequest;
+            $.getJSON(searchBox.data('suggestions-url'), {q: query}, function (data) {
+                if (requestNumber !== suggestionRequest) {
+                    return;
+                }
+                let suggestions = $('#search-suggestions').empty();
+                $.each(data.suggestions, function (index, suggestion) {
+                    suggestions.append($('<option>').attr('value', suggestion.name));
+                });
+            });
+        }, 150);
+    });
+
 });
\ No newline at end of file
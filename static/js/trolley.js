@@ -0,0 +1,156 @@
+//This file sends changes to the shopping trolley to the trolley API as JSON,
+//so products can be added, updated and removed without a redirect or
+//reloading the page. The API sends back the changed lines, the trolley
+//summary and the messages to show, which are used to update the page. If
+//the API cannot be reached or fails with a server error the form is
+//submitted the normal way instead. If the API turns the change down, such
+//as for an unknown size, the error it sent back is shown and nothing is
+//submitted, so the change is not made twice.
+
+//Sending a list of add, set and remove operations to the trolley API
+function sendTrolleyChanges(operations) {
+    return $.ajax({
+        url: $('body').data('trolley-api-url'),
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({operations: operations}),
+        headers: {
+            'X-CSRFToken': $('input[name="csrfmiddlewaretoken"]').first().val()
+        },
+    });
+}
+
+//Showing a message in the same toast style as the django messages
+function showTrolleyMessage(message) {
+    let container = $('.message-container');
+    if (!container.length) {
+        container = $('<div class="message-container p-1 p-md-0"></div>')
+            .insertAfter('header');
+    }
+    let template = document.getElementById('trolley-toast-template');
+    let toast = template.content.querySelector('.toast').cloneNode(true);
+    $(toast).find('.toast-body').text(message);
+    container.append(toast);
+    new bootstrap.Toast(toast, {
+        autohide: true,
+        animation: true,
+        delay: 10000,
+    }).show();
+}
+
+//The function handling a failed request to the trolley API. Errors in the
+//request itself are shown as a message, fallback is only called when the
+//API could not be reached or had a server error.
+function trolleyFailure(fallback) {
+    return function (xhr) {
+        if (xhr.status >= 400 && xhr.status < 500) {
+            let error = xhr.responseJSON && xhr.responseJSON.error;
+            showTrolleyMessage(error ||
+                'Sorry, your shopping trolley could not be updated');
+        } else {
+            fallback();
+        }
+    };
+}
+
+//Updating the header trolley total and the totals on the trolley page
+function showTrolleySummary(summary) {
+    let hasTotal = Number(summary.final_total) > 0;
+    let freeDelivery = Number(summary.free_delivery) <= 0;
+    $('.trolley-badge')
+        .toggleClass('text-info font-weight-bold', hasTotal)
+        .toggleClass('text-black', !hasTotal);
+    $('.trolley-badge-total').text(`£${summary.final_total}`);
+    $('.trolley-total').text(summary.total);
+    $('.trolley-delivery').text(summary.delivery);
+    $('.trolley-final-total').text(summary.final_total);
+    $('.trolley-free-delivery').text(summary.free_delivery);
+    $('.trolley-delivery-free').toggleClass('d-none', !freeDelivery);
+    $('.trolley-delivery-charge').toggleClass('d-none', freeDelivery);
+    $('.trolley-free-delivery-warning').toggleClass('d-none', freeDelivery);
+}
+
+//Updating the quantity and subtotal of each changed line on the trolley
+//page, lines with a quantity of zero are taken off the page
+function showTrolleyLines(lines) {
+    $.each(lines, function (index, line) {
+        let rows = $(`[data-trolley-line="${line.product_id}-${line.size || ''}"]`);
+        if (line.quantity === 0) {
+            rows.remove();
+            return;
+        }
+        rows.find('.line-quantity').text(line.quantity);
+        rows.find('.line-subtotal').text(line.subtotal);
+        rows.find('.quantity_input').val(line.quantity);
+    });
+}
+
+//Showing everything sent back by the trolley API, when the last product
+//is removed from the trolley page it is reloaded to show the empty trolley
+function showTrolleyChanges(data) {
+    showTrolleyLines(data.lines);
+    showTrolleySummary(data.summary);
+    $.each(data.messages, function (index, message) {
+        showTrolleyMessage(message);
+    });
+    if (data.summary.product_count === 0 && $('[data-trolley-line]').length) {
+        location.reload();
+    }
+}
+
+//The operation for a trolley form, using the product id, the size if the
+//product has sizes and the quantity in the form
+function trolleyOperation(form, op) {
+    let operation = {
+        op: op,
+        product_id: form.find('.quantity_input').data('item_id'),
+    };
+    let size = form.find('[name="clothing_sizes"]').val();
+    if (size) {
+        operation.size = size;
+    }
+    if (op !== 'remove') {
+        operation.quantity = parseInt(form.find('.quantity_input').val());
+    }
+    return operation;
+}
+
+$(document).ready(function () {
+    //Adding a product to the trolley from the product details page
+    $('.add-to-trolley-form').on('submit', function (e) {
+        e.preventDefault();
+        let form = this;
+        sendTrolleyChanges([trolleyOperation($(form), 'add')])
+            .done(showTrolleyChanges)
+            .fail(trolleyFailure(function () {
+                form.submit();
+            }));
+    });
+
+    //Updating the quantity of a line on the trolley page, with the update
+    //button or by pressing enter in the quantity input
+    $('.update-qty-form').on('submit', function (e) {
+        e.preventDefault();
+        let form = this;
+        sendTrolleyChanges([trolleyOperation($(form), 'set')])
+            .done(showTrolleyChanges)
+            .fail(trolleyFailure(function () {
+                form.submit();
+            }));
+    });
+    $('.update-item').on('click', function (e) {
+        e.preventDefault();
+        $(this).prevAll('.update-qty-form').first().trigger('submit');
+    });
+
+    //Removing a line from the trolley page
+    $('.remove-item').on('click', function (e) {
+        e.preventDefault();
+        let form = $(this).prevAll('.update-qty-form').first();
+        sendTrolleyChanges([trolleyOperation(form, 'remove')])
+            .done(showTrolleyChanges)
+            .fail(trolleyFailure(function () {
+                location.reload();
+            }));
+    });
+});
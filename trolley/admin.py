@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+# Importing the stored trolley models
+from .models import Trolley, TrolleyLine
+
+
+class TrolleyLineAdminInline(admin.TabularInline):
+    """Showing the lines of a trolley inside the trolley admin"""
+    model = TrolleyLine
+    raw_id_fields = ('product',)
+    extra = 0
+
+
+class TrolleyAdmin(admin.ModelAdmin):
+    """The stored trolleys of logged in users"""
+    inlines = (TrolleyLineAdminInline,)
+    readonly_fields = ('date_updated',)
+    list_display = ('user', 'date_updated')
+    ordering = ('-date_updated',)
+
+
+admin.site.register(Trolley, TrolleyAdmin)
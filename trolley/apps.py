@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TrolleyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trolley'
+
+    # Overriding the ready method and importing our signals module
+    def ready(self):
+        import trolley.signals
@@ -0,0 +1,126 @@
+"""
+Applying several trolley changes sent to the trolley API in one request.
+
+The API is sent a list of operations, each adding to, setting or
+removing one trolley line, for example
+
+    {"operations": [
+        {"op": "add", "product_id": 12, "size": "m", "quantity": 1},
+        {"op": "set", "product_id": 7, "quantity": 3},
+        {"op": "remove", "product_id": 9, "size": "xl"}]}
+
+Every operation is checked before it is applied and the trolley is only
+saved once all of them have been applied, so either the whole batch
+changes the trolley or none of it does.
+"""
+from collections import namedtuple
+
+from .trolley import SIZE_CODES
+
+OPERATIONS = ('add', 'set', 'remove')
+
+# The largest quantity that can be added or set in one operation, the
+# same as the quantity inputs on the product and trolley pages
+MAX_QUANTITY = 99
+
+# The most operations accepted in one request
+MAX_OPERATIONS = 50
+
+Operation = namedtuple('Operation', 'op product_id size quantity')
+
+
+class BatchError(ValueError):
+    """Raised for a batch of operations that cannot be applied"""
+
+
+def _integer(value, name):
+    # Booleans are integers in Python but are not accepted here
+    if isinstance(value, bool):
+        raise BatchError(f'{name} must be a whole number')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BatchError(f'{name} must be a whole number')
+
+
+def parse_operations(data):
+    """
+    Turning the decoded request body into a list of operations, raising
+    BatchError if any of them are not valid
+    """
+    if not isinstance(data, dict) or not isinstance(
+            data.get('operations'), list):
+        raise BatchError('Expected an object with a list of operations')
+    if not data['operations']:
+        raise BatchError('No operations were given')
+    if len(data['operations']) > MAX_OPERATIONS:
+        raise BatchError(f'At most {MAX_OPERATIONS} operations can be sent')
+
+    operations = []
+    for number, item in enumerate(data['operations'], 1):
+        if not isinstance(item, dict) or item.get('op') not in OPERATIONS:
+            raise BatchError(
+                f'Operation {number}: op must be one of '
+                f'{", ".join(OPERATIONS)}')
+        op = item['op']
+        try:
+            product_id = _integer(item.get('product_id'), 'product_id')
+            size = item.get('size') or None
+            if size is not None and size not in SIZE_CODES:
+                raise BatchError(f'Unknown size {size!r}')
+            quantity = 0
+            if op != 'remove':
+                quantity = _integer(item.get('quantity'), 'quantity')
+                lowest = 1 if op == 'add' else 0
+                if not lowest <= quantity <= MAX_QUANTITY:
+                    raise BatchError(
+                        f'quantity must be from {lowest} to {MAX_QUANTITY}')
+        except BatchError as error:
+            raise BatchError(f'Operation {number}: {error}') from error
+        operations.append(Operation(op, product_id, size, quantity))
+    return operations
+
+
+def apply_operations(trolley, operations, products):
+    """
+    Applying the operations to the trolley, products is a dictionary of
+    the products in the operations by id. Returns a dictionary of each
+    changed line, (product id, size), to its quantity before and after.
+    """
+    changes = {}
+    for number, operation in enumerate(operations, 1):
+        op, product_id, size, quantity = operation
+        product = products.get(product_id)
+        if product is None:
+            raise BatchError(
+                f'Operation {number}: Product {product_id} does not exist')
+        if op != 'remove' and bool(size) != bool(product.product_sizes):
+            raise BatchError(
+                f'Operation {number}: A size must be given for products '
+                'with sizes and only for them')
+
+        previous = trolley.quantity(product_id, size)
+        if op == 'add':
+            new = trolley.add(product_id, quantity, size)
+        elif op == 'set':
+            new = trolley.set(product_id, quantity, size)
+        else:
+            trolley.remove(product_id, size)
+            new = 0
+
+        # A line changed by several operations keeps its first quantity
+        key = (product_id, size)
+        changes[key] = (changes.get(key, (previous,))[0], new)
+    return changes
+
+
+def change_message(product, size, previous, new):
+    """The message shown to the user for a changed trolley line"""
+    name = product.product_name
+    if size:
+        name = f'Size {size.upper()} - {name}'
+    if not new:
+        return f'{name}, has been removed from your shopping trolley'
+    if not previous:
+        return f'{name}, has been added to your shopping trolley'
+    return f'{name} quantity has been updated to {new}'
@@ -1,72 +1,186 @@
-from decimal import Decimal
 from django.conf import settings
-from django.shortcuts import get_object_or_404
-from products.models import Product
+from django.contrib import messages
+from products.caching import PRICES, get_version
+from products.product_cache import prices_version
+from .summary import (
+    add_to_summary, current_trolley_summary, delivery_totals,
+    store_trolley_summary, stored_trolley_summary, summary_totals)
+from .trolley import Trolley
 
+# The trolley values added to every template context
+TROLLEY_CONTEXT_KEYS = (
+    'trolley_items', 'total', 'product_count', 'delivery', 'free_delivery',
+    'free_delivery_limit', 'final_total',
+)
 
-def trolley_contents(request):
 
+def build_trolley_contents(request):
+    """
+    Working out the trolley items, totals and delivery charge from the
+    trolley session
+    """
     # creating empty list for trolley items and
     # initializing total and product count to zero
     trolley_items = []
     total = 0
     product_count = 0
-    # Getting trolley session if one exist, if not it will
-    # create an empty dictionary
-    trolley = request.session.get('trolley', {})
-
-    # Iterating through all items in the shopping trolley and checking
-    # if the item has a size, if no sizes then it will add
-    # up the total cost, quantity and add the product data to the
-    # trolley item list to be shown in the shopping trolley page template.
-    # if it does then it will execute the code block after the else statement
-    for item_id, item_data in trolley.items():
-        if isinstance(item_data, int):
-            product = get_object_or_404(Product, pk=item_id)
-            total += item_data * product.product_price
-            product_count += item_data
-            trolley_items.append({
-                'item_id': item_id,
-                'quantity': item_data,
-                'product': product,
-            })
+    # Getting the trolley from the session, an empty trolley is
+    # returned if there is not one yet
+    trolley = Trolley.load(request)
+
+    # The summary is stamped with the prices version of the products
+    # kept in memory, which can be behind the current version for a few
+    # seconds after a price change. A summary worked out from the old
+    # prices is then out of date, and worked out again once they are
+    # loaded. The version is read before the products, so if a price
+    # changes while the trolley is worked out the summary is out of date.
+    version = prices_version()
+
+    # Getting every product in the trolley with a single query, products
+    # that have been deleted since they were added are not returned. The
+    # products of a stored trolley were already loaded with its lines.
+    products = trolley.products()
+
+    # Iterating through all lines in the shopping trolley, adding up the
+    # total cost and quantity and adding the product data to the trolley
+    # item list to be shown in the shopping trolley page template. Lines
+    # for products with sizes also have the size to show.
+    removed = set()
+    for product_id, size, quantity in trolley:
+        product = products.get(product_id)
+        if product is None:
+            removed.add(product_id)
+            continue
+        total += quantity * product.product_price
+        product_count += quantity
+        item = {
+            'item_id': product_id,
+            'quantity': quantity,
+            'product': product,
+        }
+        if size:
+            item['size'] = size
+        trolley_items.append(item)
+
+    # Taking any deleted products out of the trolley session and
+    # letting the user know they are no longer available
+    if removed:
+        for product_id in removed:
+            trolley.remove_product(product_id)
+        trolley.save(request)
+        messages.warning(request, (
+            f'{len(removed)} product(s) in your shopping trolley are no '
+            'longer available and have been removed'
+        ))
+
+    # Storing the total and product count as the trolley summary, so the
+    # header total can be shown on the next pages without the products.
+    # A stored trolley's summary also holds the hash of its lines.
+    content_hash = trolley.content_hash() if trolley.user else None
+    store_trolley_summary(
+        request, total, product_count, version, content_hash)
+
+    # dictionary with keys and values to be used in the rendered html
+    # template, the delivery charge is worked out from the total
+    contents = dict(
+        delivery_totals(total),
+        trolley_items=trolley_items,
+        product_count=product_count,
+    )
+
+    return contents
+
+
+def get_trolley_contents(request):
+    """
+    Returning the trolley contents for the request, they are only
+    worked out once and remembered for the rest of the request
+    """
+    if not hasattr(request, '_trolley_contents'):
+        request._trolley_contents = build_trolley_contents(request)
+    return request._trolley_contents
+
+
+def get_trolley_summary(request):
+    """
+    Returning the trolley total, product count and delivery totals from
+    the trolley summary in the session, or from the whole trolley if the
+    summary is out of date. They are only looked up once for each request.
+    """
+    if not hasattr(request, '_trolley_summary'):
+        summary = current_trolley_summary(request)
+        if summary is None:
+            request._trolley_summary = get_trolley_contents(request)
         else:
-            # Iterating thorugh the dictionary item_size, then incrementing the
-            # quantity and total accordingly and adding product size to render
-            # to the trolley page template.
-            product = get_object_or_404(Product, pk=item_id)
-            for size, quantity in item_data['item_size'].items():
-                total += quantity * product.product_price
-                product_count += quantity
-                trolley_items.append({
-                    'item_id': item_id,
-                    'quantity': quantity,
-                    'product': product,
-                    'size': size,
-                })
-
-    # This block of code is calculates the free delivery limit on orders
-    # which is £50 or more and if its not then will charge customers a delivery
-    # fee of 10 percent of the total order.
-    if total < settings.FREE_DELIVERY_LIMIT:
-        delivery = total * Decimal(settings.STANDARD_DELIVERY_PERCENTAGE / 100)
-        free_delivery = settings.FREE_DELIVERY_LIMIT - total
+            request._trolley_summary = summary_totals(summary)
+    return request._trolley_summary
+
+
+def update_trolley_summary(request, total_change, count_change):
+    """
+    Updating the trolley summary after the trolley has been changed and
+    saved, by the change in the total and product count, or working out
+    the whole trolley again if the summary is out of date
+    """
+    request.__dict__.pop('_trolley_summary', None)
+    summary = current_trolley_summary(request)
+    # The change was worked out from the products kept in memory, so it
+    # is only added if they have the same prices as the summary
+    if summary is None or summary['version'] != prices_version():
+        build_trolley_contents(request)
     else:
-        delivery = 0
-        free_delivery = 0
+        add_to_summary(request, summary, total_change, count_change)
 
-    final_total = delivery + total
 
-    # context dictionary with keys and values to be
-    # used in the rendered html template
-    context = {
-        'trolley_items': trolley_items,
-        'total': total,
-        'product_count': product_count,
-        'delivery': delivery,
-        'free_delivery': free_delivery,
-        'free_delivery_limit': settings.FREE_DELIVERY_LIMIT,
-        'final_total': final_total,
-    }
+def get_trolley_fragment_key(request):
+    """
+    The key the cached trolley fragments, the header trolley total and
+    the trolley list toast, are stored under. It is made from a hash of
+    the trolley lines, the catalogue version and the prices version the
+    trolley summary was worked out from, so it changes whenever the
+    trolley, a product or a price changes. A total worked out from the
+    old prices kept in memory after a price change is stored under the
+    old prices version, so it is never shown once the summary has been
+    worked out from the new prices. The hash comes from the session
+    trolley, or from the summary of a stored trolley, so no products or
+    lines are loaded to work it out.
+    """
+    if not hasattr(request, '_trolley_fragment_key'):
+        summary = current_trolley_summary(request)
+        if summary is None or (
+                request.user.is_authenticated and 'hash' not in summary):
+            get_trolley_contents(request)
+            summary = stored_trolley_summary(request)
+        if summary and 'hash' in summary:
+            content_hash = summary['hash']
+        else:
+            content_hash = Trolley.load(request).content_hash()
+        version = summary['version'] if summary else get_version(PRICES)
+        request._trolley_fragment_key = (
+            f'{content_hash}:{get_version()}:{version}')
+    return request._trolley_fragment_key
 
+
+def _lazy_value(request, key):
+    """A function returning one of the trolley values when it is called"""
+    if key == 'trolley_items':
+        return lambda: get_trolley_contents(request)[key]
+    return lambda: get_trolley_summary(request)[key]
+
+
+def trolley_contents(request):
+    """
+    The trolley context processor. Templates call any function they
+    are given, so every value is given as a function and the trolley is
+    only worked out the first time a template uses one of them. Pages
+    that never show the trolley do not load the trolley products at all,
+    and the totals come from the trolley summary unless the trolley
+    items are shown too.
+    """
+    context = {
+        key: _lazy_value(request, key) for key in TROLLEY_CONTEXT_KEYS}
+    context['trolley_fragment_key'] = (
+        lambda: get_trolley_fragment_key(request))
+    context['trolley_fragment_timeout'] = (
+        settings.TROLLEY_FRAGMENT_CACHE_TIMEOUT)
     return context
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.4 on 2026-10-17 10:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0012_product_sku_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trolley',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                 primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='trolley', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrolleyLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                 primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(
+                    blank=True, default='', max_length=4)),
+                ('quantity', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+', to='products.product')),
+                ('trolley', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='lines', to='trolley.trolley')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='trolleyline',
+            constraint=models.UniqueConstraint(
+                fields=('trolley', 'product', 'size'),
+                name='unique_trolley_line'),
+        ),
+    ]
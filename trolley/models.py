@@ -1,3 +1,47 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+# Used in the trolley line model for the foreign key
+from products.models import Product
+
+
+class Trolley(models.Model):
+    """
+    The shopping trolley of a logged in user, kept in the database so
+    it is the same on every device the user logs in on. Visitors who are
+    not logged in keep their trolley in the session, which is merged into
+    this trolley when they log in.
+    """
+    # a user can only have one trolley
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='trolley')
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Trolley of {self.user}'
+
+
+class TrolleyLine(models.Model):
+    """
+    One line of a stored trolley, a product, the size for products with
+    sizes or an empty string for products without, and the quantity
+    """
+    trolley = models.ForeignKey(
+        Trolley, on_delete=models.CASCADE, related_name='lines')
+    # Lines are deleted along with their product, so a stored trolley
+    # never holds a product that no longer exists
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+    # My product sizes XS, S, M, L, XL, XXL, XXXL
+    size = models.CharField(max_length=4, blank=True, default='')
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trolley', 'product', 'size'],
+                name='unique_trolley_line'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} {self.size}'.strip()
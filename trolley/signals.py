@@ -0,0 +1,15 @@
+# Importing the user logged in signal and a receiver for it
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .trolley import merge_session_trolley
+
+
+@receiver(user_logged_in)
+def merge_trolley_on_login(sender, request, user, **kwargs):
+    """
+    Moving the trolley a visitor filled before logging in into their
+    stored trolley, adding to the quantities already stored
+    """
+    if request is not None:
+        merge_session_trolley(request, user)
@@ -0,0 +1,107 @@
+"""
+The trolley summary stored in the session next to the trolley.
+
+The summary holds the trolley total and product count, stamped with the
+prices version they were worked out from. The trolley views update it
+as products are added, adjusted and removed, so the header total and
+the delivery messages can be shown without loading any products. The
+summary is only worked out again from the products when a price has
+changed or a product has been deleted since it was stamped.
+
+The summary of a logged in user's stored trolley is kept in the cache
+instead, so it is shared by all of the user's devices. It is deleted
+whenever the stored trolley is saved and worked out again when needed,
+and also holds a hash of the trolley lines for the trolley fragment
+cache key, so the key can be worked out without loading the lines.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from products.caching import PRICES, get_version
+
+SUMMARY_KEY = 'trolley_summary'
+
+
+def user_summary_key(user):
+    """The cache key of the summary of a user's stored trolley"""
+    return f'{SUMMARY_KEY}:{user.pk}'
+
+
+def stored_trolley_summary(request):
+    """The stored summary, whether or not it is up to date"""
+    if request.user.is_authenticated:
+        return cache.get(user_summary_key(request.user))
+    return request.session.get(SUMMARY_KEY)
+
+
+def delivery_totals(total):
+    """
+    Working out the delivery charge and final total for a trolley
+    total. Orders of £50 or more get free delivery, if not customers
+    are charged a delivery fee of 10 percent of the total order.
+    """
+    if total < settings.FREE_DELIVERY_LIMIT:
+        delivery = total * Decimal(settings.STANDARD_DELIVERY_PERCENTAGE / 100)
+        free_delivery = settings.FREE_DELIVERY_LIMIT - total
+    else:
+        delivery = 0
+        free_delivery = 0
+
+    return {
+        'total': total,
+        'delivery': delivery,
+        'free_delivery': free_delivery,
+        'free_delivery_limit': settings.FREE_DELIVERY_LIMIT,
+        'final_total': delivery + total,
+    }
+
+
+def store_trolley_summary(
+        request, total, product_count, version=None, content_hash=None):
+    """
+    Storing the summary, stamped with the prices version. An empty
+    trolley summary is not stored for visitors who have never had a
+    trolley, so their sessions are not saved on every page.
+    """
+    summary = {
+        'version': get_version(PRICES) if version is None else version,
+        'total': str(total),
+        'product_count': product_count,
+    }
+    if content_hash is not None:
+        summary['hash'] = content_hash
+    if request.user.is_authenticated:
+        cache.set(
+            user_summary_key(request.user), summary,
+            settings.TROLLEY_SUMMARY_CACHE_TIMEOUT)
+        return
+    if not product_count and SUMMARY_KEY not in request.session:
+        return
+    if request.session.get(SUMMARY_KEY) != summary:
+        request.session[SUMMARY_KEY] = summary
+
+
+def current_trolley_summary(request):
+    """Returning the stored summary if it is still up to date"""
+    summary = stored_trolley_summary(request)
+    if summary and summary['version'] == get_version(PRICES):
+        return summary
+    return None
+
+
+def summary_totals(summary):
+    """The total, product count and delivery totals of a stored summary"""
+    return dict(
+        delivery_totals(Decimal(summary['total'])),
+        product_count=summary['product_count'])
+
+
+def add_to_summary(request, summary, total_change, count_change):
+    """Adding a change in total and product count to the stored summary"""
+    store_trolley_summary(
+        request,
+        Decimal(summary['total']) + total_change,
+        summary['product_count'] + count_change,
+        summary['version'])
@@ -0,0 +1,336 @@
+"""
+The shopping trolley, stored in the session or in the database.
+
+All trolley, checkout and webhook code reads and changes the trolley
+through the Trolley class, so none of it needs to know how the trolley
+is stored.
+
+Visitors who are not logged in keep their trolley in the session. The
+session holds a flat list starting with the format version, followed by
+a product id, size code and quantity for each line, for example
+[2, 7, 0, 1, 12, 3, 2] is one of product 7 without a size and two of
+product 12 in size M. This is much smaller to store and quicker to load
+than the dictionaries used before, which are still read and are
+converted the next time the trolley is saved.
+
+Logged in users keep their trolley in the TrolleyLine model, so it
+follows them between devices. Their lines are loaded along with their
+products in one joined query, and only the lines that have changed are
+written back when the trolley is saved. A session trolley is merged into
+the stored trolley when its visitor logs in.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from products.product_cache import get_products
+from . import models
+from .summary import SUMMARY_KEY, user_summary_key
+
+SESSION_KEY = 'trolley'
+TROLLEY_VERSION = 2
+
+# The clothing sizes a product can be added in, each size is stored as
+# its position in this tuple and 0 is used for products without sizes
+SIZES = ('xs', 's', 'm', 'l', 'xl', 'xxl', 'xxxl')
+SIZE_CODES = {size: code for code, size in enumerate(SIZES, 1)}
+SIZE_CODES[None] = 0
+
+
+def _size(code):
+    return SIZES[code - 1] if code else None
+
+
+class Trolley:
+    """
+    The lines in a shopping trolley, each line is a product, a size or
+    None for products without sizes, and the quantity
+    """
+
+    def __init__(self, lines=()):
+        self._lines = {}
+        # The user of a stored trolley and its lines as they were loaded,
+        # the user is None for a session trolley
+        self.user = None
+        self._stored = {}
+        # Products already loaded with the lines, by id
+        self._products = {}
+        for product_id, size, quantity in lines:
+            self.set(product_id, quantity, size)
+
+    @classmethod
+    def load(cls, request):
+        """
+        Loading the trolley for the request, the stored trolley for
+        logged in users and the session trolley for everyone else
+        """
+        if not request.user.is_authenticated:
+            return cls.from_session(request.session)
+        # Users logged in before trolleys were stored still have their
+        # trolley in the session, so it is merged the first time
+        if SESSION_KEY in request.session:
+            merge_session_trolley(request, request.user)
+        return cls.from_database(request.user)
+
+    def save(self, request):
+        """Saving the trolley where it was loaded from"""
+        if self.user is None:
+            request.session[SESSION_KEY] = self.encode()
+        else:
+            self._save_database()
+
+    @classmethod
+    def clear(cls, request):
+        """Emptying the trolley of the request, such as after checkout"""
+        request.session.pop(SESSION_KEY, None)
+        request.session.pop(SUMMARY_KEY, None)
+        if request.user.is_authenticated:
+            models.TrolleyLine.objects.filter(
+                trolley__user=request.user).delete()
+            cache.delete(user_summary_key(request.user))
+
+    @classmethod
+    def from_session(cls, session):
+        """
+        Loading the trolley from the session. A trolley that cannot be
+        read, such as one saved in a format this version does not know,
+        is treated as empty so the visitor can still use the site, and
+        is replaced the next time the trolley is saved.
+        """
+        try:
+            return cls.decode(session.get(SESSION_KEY))
+        except (ValueError, TypeError, KeyError, IndexError):
+            return cls()
+
+    @classmethod
+    def from_database(cls, user):
+        """
+        Loading the stored trolley of a user, the lines and their
+        products come from one query joining the two tables
+        """
+        trolley = cls()
+        trolley.user = user
+        lines = models.TrolleyLine.objects.filter(
+            trolley__user=user).select_related('product')
+        for line in lines:
+            key = (line.product_id, line.size or None)
+            trolley._lines[key] = line.quantity
+            trolley._stored[key] = line
+            trolley._products[line.product_id] = line.product
+        return trolley
+
+    def _save_database(self):
+        """
+        Writing the changed lines of a stored trolley, new lines are
+        added with bulk_create, changed quantities are written with
+        bulk_update and removed lines are deleted in one query
+        """
+        if self._stored is None:
+            # Lines created by an earlier save have to be read again
+            # to get their ids
+            self._stored = {
+                (line.product_id, line.size or None): line
+                for line in models.TrolleyLine.objects.filter(
+                    trolley__user=self.user)}
+
+        to_create = []
+        to_update = []
+        for key, quantity in self._lines.items():
+            line = self._stored.get(key)
+            if line is None:
+                to_create.append(models.TrolleyLine(
+                    product_id=key[0], size=key[1] or '', quantity=quantity))
+            elif line.quantity != quantity:
+                line.quantity = quantity
+                to_update.append(line)
+        removed = [
+            line.id for key, line in self._stored.items()
+            if key not in self._lines]
+        if not (to_create or to_update or removed):
+            return
+
+        with transaction.atomic():
+            if to_create:
+                # Locking the stored trolley, so another device saving the
+                # same trolley waits until these lines have been written
+                trolleys = models.Trolley.objects.select_for_update()
+                stored = trolleys.get_or_create(user=self.user)[0]
+                to_create = self._merge_added_lines(
+                    stored, to_create, to_update)
+                for line in to_create:
+                    line.trolley = stored
+                models.TrolleyLine.objects.bulk_create(to_create)
+            if to_update:
+                models.TrolleyLine.objects.bulk_update(
+                    to_update, ['quantity'])
+            if removed:
+                models.TrolleyLine.objects.filter(id__in=removed).delete()
+            models.Trolley.objects.filter(user=self.user).update(
+                date_updated=timezone.now())
+
+        for key in [key for key in self._stored if key not in self._lines]:
+            del self._stored[key]
+        if to_create:
+            self._stored = None
+        # The summary of a stored trolley is shared by all of the user's
+        # devices, so it is worked out again rather than added to
+        cache.delete(user_summary_key(self.user))
+
+    def _merge_added_lines(self, stored, to_create, to_update):
+        """
+        Adding the quantities of new lines to any of the same lines
+        saved by another device since the trolley was loaded, so both
+        quantities are kept. Returns the lines that still need creating.
+        """
+        added = {(line.product_id, line.size or None): line
+                 for line in to_create}
+        saved = models.TrolleyLine.objects.filter(
+            trolley=stored, product_id__in={key[0] for key in added})
+        for line in saved:
+            key = (line.product_id, line.size or None)
+            if key in added:
+                line.quantity += added.pop(key).quantity
+                self._lines[key] = line.quantity
+                to_update.append(line)
+        return list(added.values())
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        Loading a trolley from JSON, such as the trolley stored on an
+        order or in the payment intent metadata
+        """
+        return cls.decode(json.loads(text) if text else None)
+
+    def to_json(self):
+        """The trolley as JSON, the same trolley always gives the same JSON"""
+        return json.dumps(self.encode(), separators=(',', ':'))
+
+    def content_hash(self):
+        """A short hash of the lines, the same lines give the same hash"""
+        return hashlib.md5(self.to_json().encode()).hexdigest()
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Loading a trolley from its stored form, reading both the flat
+        list and the dictionaries from before the flat list was used.
+        Raises ValueError if the stored form cannot be read.
+        """
+        if not data:
+            return cls()
+        if isinstance(data, dict):
+            return cls(_legacy_lines(data))
+        if data[0] != TROLLEY_VERSION:
+            raise ValueError(f'Unknown trolley version {data[0]}')
+        trolley = cls()
+        values = iter(data[1:])
+        for product_id, size_code, quantity in zip(values, values, values):
+            if size_code not in range(len(SIZES) + 1):
+                raise ValueError(f'Unknown size code {size_code!r}')
+            trolley._lines[product_id, _size(size_code)] = quantity
+        return trolley
+
+    def encode(self):
+        """The trolley as a flat list for storing"""
+        data = [TROLLEY_VERSION]
+        for (product_id, size), quantity in self._lines.items():
+            data += (product_id, SIZE_CODES[size], quantity)
+        return data
+
+    def __iter__(self):
+        """Going through the lines as (product id, size, quantity)"""
+        for (product_id, size), quantity in self._lines.items():
+            yield product_id, size, quantity
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def product_ids(self):
+        """The ids of the products in the trolley"""
+        return list(dict.fromkeys(
+            product_id for product_id, size in self._lines))
+
+    def products(self):
+        """
+        The products in the trolley by id, from the products kept in
+        memory or loaded along with a stored trolley. Products that have
+        been deleted are left out.
+        """
+        missing = [
+            product_id for product_id in self.product_ids()
+            if product_id not in self._products]
+        if missing:
+            self._products.update(get_products(missing))
+        return {
+            product_id: self._products[product_id]
+            for product_id in self.product_ids()
+            if product_id in self._products}
+
+    def quantity(self, product_id, size=None):
+        """The quantity of a product, or of one size of it, in the trolley"""
+        return self._lines.get((int(product_id), size or None), 0)
+
+    def add(self, product_id, quantity, size=None):
+        """Adding to the quantity of a product and returning the new one"""
+        return self.set(
+            product_id, self.quantity(product_id, size) + quantity, size)
+
+    def set(self, product_id, quantity, size=None):
+        """
+        Setting the quantity of a product, a quantity of zero or less
+        removes it from the trolley. Returns the new quantity.
+        """
+        if size and size not in SIZE_CODES:
+            raise ValueError(f'Unknown size {size!r}')
+        key = (int(product_id), size or None)
+        if quantity > 0:
+            self._lines[key] = quantity
+        else:
+            self._lines.pop(key, None)
+        return max(quantity, 0)
+
+    def remove(self, product_id, size=None):
+        """Removing a product, or one size of it, from the trolley"""
+        self._lines.pop((int(product_id), size or None), None)
+
+    def remove_product(self, product_id):
+        """Removing every size of a product from the trolley"""
+        for key in [key for key in self._lines if key[0] == product_id]:
+            del self._lines[key]
+
+
+def _legacy_lines(data):
+    """
+    Reading the lines from the old trolley dictionary, where each
+    product id maps to a quantity or to {'item_size': {size: quantity}}
+    """
+    for item_id, item_data in data.items():
+        if isinstance(item_data, int):
+            yield int(item_id), None, item_data
+        else:
+            for size, quantity in item_data['item_size'].items():
+                yield int(item_id), size, quantity
+
+
+def merge_session_trolley(request, user):
+    """
+    Adding the lines of the session trolley to the user's stored trolley
+    and taking the trolley out of the session, used when a visitor logs
+    in. The trolley summary is worked out again from the stored trolley.
+    """
+    session_trolley = Trolley.from_session(request.session)
+    request.session.pop(SESSION_KEY, None)
+    request.session.pop(SUMMARY_KEY, None)
+    if not session_trolley:
+        return
+    trolley = Trolley.from_database(user)
+    for product_id, size, quantity in session_trolley:
+        trolley.add(product_id, quantity, size)
+    trolley.save(request)
@@ -4,6 +4,7 @@ from . import views
 # All shopping trolley app URLs
 urlpatterns = [
     path('', views.view_trolley, name='view_trolley'),
+    path('api/', views.trolley_api, name='trolley_api'),
     path('add/<item_id>/', views.add_to_trolley, name='add_to_trolley'),
     path('adjust/<item_id>/', views.adjust_trolley, name='adjust_trolley'),
     path('remove/<item_id>/', views.remove_from_trolley,
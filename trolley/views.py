@@ -1,8 +1,15 @@
-from django.shortcuts import (
-    render, redirect, reverse, HttpResponse, get_object_or_404)
+import json
+
+from django.shortcuts import render, redirect, reverse, HttpResponse
 from django.contrib import messages
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 
-from products.models import Product
+from products.product_cache import get_product_or_404, get_products
+from .batch import (
+    BatchError, apply_operations, change_message, parse_operations)
+from .contexts import get_trolley_summary, update_trolley_summary
+from .trolley import Trolley
 
 # Create your views here.
 
@@ -28,47 +35,45 @@ def add_to_trolley(request, item_id):
     informing them that the product has been added to the shopping trolley.
     """
 
-    product = get_object_or_404(Product, pk=item_id)
+    product = get_product_or_404(item_id)
     quantity = int(request.POST.get('product_quantity'))
     redirect_url = request.POST.get('redirect_url')
     size = None
     if 'clothing_sizes' in request.POST:
         size = request.POST['clothing_sizes']
-    trolley = request.session.get('trolley', {})
+    trolley = Trolley.load(request)
+    previous_quantity = trolley.quantity(item_id, size)
+    try:
+        new_quantity = trolley.add(item_id, quantity, size)
+    # The size posted is not one of the clothing sizes
+    except ValueError:
+        messages.error(request, (
+            f'Sorry, {product.product_name} is not available in that size'))
+        return redirect(redirect_url)
 
     if size:
-        if item_id in list(trolley.keys()):
-            if size in trolley[item_id]['item_size'].keys():
-                trolley[item_id]['item_size'][size] += quantity
-                messages.success(
-                    request, f'Size {size.upper()} - {product.product_name}\
-                        quantity has been updated to\
-                            {trolley[item_id]["item_size"][size]}')
-            else:
-                trolley[item_id]['item_size'][size] = quantity
-                messages.success(
-                    request, f'Size {size.upper()} -\
-                        {product.product_name}, has been added to\
-                            your shopping trolley')
+        if previous_quantity:
+            messages.success(
+                request, f'Size {size.upper()} - {product.product_name}\
+                    quantity has been updated to {new_quantity}')
         else:
-            trolley[item_id] = {'item_size': {size: quantity}}
             messages.success(
                 request, f'Size {size.upper()} -\
-                        {product.product_name}, has been added to\
-                            your shopping trolley')
+                    {product.product_name}, has been added to\
+                        your shopping trolley')
     else:
-        if item_id in list(trolley.keys()):
-            trolley[item_id] += quantity
+        if previous_quantity:
             messages.success(
                 request, f'{product.product_name}\
-                    quantity has been updated to {trolley[item_id]}')
+                    quantity has been updated to {new_quantity}')
         else:
-            trolley[item_id] = quantity
             messages.success(
                 request, f'{product.product_name}, has been added to\
                     your shopping trolley')
 
-    request.session['trolley'] = trolley
+    trolley.save(request)
+    change = new_quantity - previous_quantity
+    update_trolley_summary(request, product.product_price * change, change)
     return redirect(redirect_url)
 
 
@@ -82,41 +87,44 @@ def adjust_trolley(request, item_id):
     form is updated it will also remove the product from the shopping trolley.
     """
 
-    product = get_object_or_404(Product, pk=item_id)
+    product = get_product_or_404(item_id)
     quantity = int(request.POST.get('product_quantity'))
     size = None
     if 'clothing_sizes' in request.POST:
         size = request.POST['clothing_sizes']
-    trolley = request.session.get('trolley', {})
+    trolley = Trolley.load(request)
+    previous_quantity = trolley.quantity(item_id, size)
+    try:
+        new_quantity = trolley.set(item_id, quantity, size)
+    # The size posted is not one of the clothing sizes
+    except ValueError:
+        messages.error(request, (
+            f'Sorry, {product.product_name} is not available in that size'))
+        return redirect(reverse('view_trolley'))
 
     if size:
-        if quantity > 0:
-            trolley[item_id]['item_size'][size] = quantity
+        if new_quantity > 0:
             messages.success(
                 request, f'Size {size.upper()} - {product.product_name}\
-                    quantity has been updated to\
-                        {trolley[item_id]["item_size"][size]}')
+                    quantity has been updated to {new_quantity}')
         else:
-            del trolley[item_id]['item_size'][size]
-            if not trolley[item_id]['item_size']:
-                trolley.pop(item_id)
             messages.success(
                 request, f'Size {size.upper()} -\
                     {product.product_name}, has been removed\
                 from your shopping trolley')
     else:
-        if quantity > 0:
-            trolley[item_id] = quantity
+        if new_quantity > 0:
             messages.success(
                 request, f'{product.product_name}\
-                    quantity has been updated to {trolley[item_id]}')
+                    quantity has been updated to {new_quantity}')
         else:
-            trolley.pop(item_id)
             messages.success(
                 request, f'{product.product_name}, has been removed\
                 from your shopping trolley')
 
-    request.session['trolley'] = trolley
+    trolley.save(request)
+    change = new_quantity - previous_quantity
+    update_trolley_summary(request, product.product_price * change, change)
     # Once the user updates the quantity they will
     # be taken back to the shopping trolley page
     return redirect(reverse('view_trolley'))
@@ -132,27 +140,28 @@ def remove_from_trolley(request, item_id):
     """
     # Try block used to catch server errors and display an error message
     try:
-        product = get_object_or_404(Product, pk=item_id)
+        product = get_product_or_404(item_id)
         size = None
         if 'clothing_sizes' in request.POST:
             size = request.POST['clothing_sizes']
-        trolley = request.session.get('trolley', {})
+        trolley = Trolley.load(request)
+        previous_quantity = trolley.quantity(item_id, size)
+        trolley.remove(item_id, size)
 
         if size:
-            del trolley[item_id]['item_size'][size]
-            if not trolley[item_id]['item_size']:
-                trolley.pop(item_id)
             messages.success(
                 request, f'Size {size.upper()} - \
                     {product.product_name}, has been removed\
                 from your shopping trolley')
         else:
-            trolley.pop(item_id)
             messages.success(
                 request, f'{product.product_name}, has been removed\
                 from your shopping trolley')
 
-        request.session['trolley'] = trolley
+        trolley.save(request)
+        update_trolley_summary(
+            request, -product.product_price * previous_quantity,
+            -previous_quantity)
         # 200 terminal response on successful product removal from trolley
         return HttpResponse(status=200)
 
@@ -160,3 +169,72 @@ def remove_from_trolley(request, item_id):
     except Exception as e:
         messages.error(request, f'Error removing item: {e}')
         return HttpResponse(status=500)
+
+
+# The summary values returned by the trolley API
+SUMMARY_FIELDS = ('total', 'delivery', 'free_delivery', 'final_total')
+
+
+def _money(value):
+    return f'{value:.2f}'
+
+
+@require_POST
+def trolley_api(request):
+    """
+    Applying a batch of add, set and remove operations to the shopping
+    trolley, sent as JSON, see batch.py. Either every operation is
+    applied or none are. The changed lines with their new quantities and
+    subtotals, the trolley summary and the messages for the user are
+    returned as JSON, so the page can be updated without a redirect or
+    reloading the whole page. The messages are returned rather than
+    added to the session, as they are shown straight away by the page.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'The request body is not valid JSON'}, status=400)
+    try:
+        operations = parse_operations(data)
+    except BatchError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    products = get_products(
+        operation.product_id for operation in operations)
+    trolley = Trolley.load(request)
+    try:
+        changes = apply_operations(trolley, operations, products)
+    except BatchError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    lines = []
+    user_messages = []
+    total_change = 0
+    count_change = 0
+    for (product_id, size), (previous, new) in changes.items():
+        if previous == new:
+            continue
+        product = products[product_id]
+        total_change += product.product_price * (new - previous)
+        count_change += new - previous
+        lines.append({
+            'product_id': product_id,
+            'size': size,
+            'quantity': new,
+            'subtotal': _money(product.product_price * new),
+        })
+        user_messages.append(change_message(product, size, previous, new))
+
+    if lines:
+        trolley.save(request)
+        update_trolley_summary(request, total_change, count_change)
+    summary = get_trolley_summary(request)
+
+    return JsonResponse({
+        'lines': lines,
+        'summary': dict(
+            {field: _money(summary[field]) for field in SUMMARY_FIELDS},
+            product_count=summary['product_count']),
+        'messages': user_messages,
+    })
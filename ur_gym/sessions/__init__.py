@@ -0,0 +1,57 @@
+"""
+Session engines that only save a session when its data has changed.
+
+Django saves a session whenever it is marked as modified, even if the
+values written are the same as the ones already stored, for example
+when a trolley quantity is adjusted to the quantity it already was or a
+message is added and shown in the same request. These engines keep a
+copy of the session as it was loaded and only mark it as modified when
+the data is actually different, so the session store and the session
+cookie are only written when something has changed.
+
+The engine is picked with the SESSION_STORE setting, see settings.py.
+"""
+
+
+class DirtyTrackingMixin:
+    """
+    Added in front of a Django SessionStore to compare the session with
+    the copy taken when it was loaded or last saved before it is saved
+    """
+    _modified = False
+    _saved_data = None
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # The key in the visitor's cookie, if the key changes, such as
+        # when logging in, the session has to be saved to send the new key
+        self._cookie_key = session_key
+
+    def _dumps(self, data):
+        return self.serializer().dumps(data)
+
+    @property
+    def modified(self):
+        # Only worked out when something has marked the session as
+        # modified, a session that has not been loaded is left as it is
+        if self._modified and hasattr(self, '_session_cache'):
+            if self._saved_data is None:
+                self._saved_data = self._dumps({})
+            self._modified = (
+                self.session_key != self._cookie_key
+                or self._dumps(self._session_cache) != self._saved_data)
+        return self._modified
+
+    @modified.setter
+    def modified(self, value):
+        self._modified = value
+
+    def load(self):
+        data = super().load()
+        self._saved_data = self._dumps(data)
+        return data
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        self._saved_data = self._dumps(self._session_cache)
+        self._modified = False
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cache
+
+from . import DirtyTrackingMixin
+
+
+class SessionStore(DirtyTrackingMixin, cache.SessionStore):
+    pass
@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cached_db
+
+from . import DirtyTrackingMixin
+
+
+class SessionStore(DirtyTrackingMixin, cached_db.SessionStore):
+    pass
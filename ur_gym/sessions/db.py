@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import db
+
+from . import DirtyTrackingMixin
+
+
+class SessionStore(DirtyTrackingMixin, db.SessionStore):
+    pass
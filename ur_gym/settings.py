@@ -74,6 +74,7 @@ INSTALLED_APPS = [
     'checkout',
     'profiles',
     'community',
+    'outbox',
 
     # Other
     'crispy_forms',
@@ -156,6 +157,18 @@ else:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
     DEFAULT_FROM_EMAIL = 'info@urgym.com'
 
+# Emails are saved in the outbox and sent by the send_outbox command,
+# using the email backend above. A failed email is tried again after
+# OUTBOX_RETRY_DELAY seconds, twice as long after each attempt, up to
+# OUTBOX_MAX_ATTEMPTS times. An email claimed by a sender that stops is
+# picked up again after OUTBOX_CLAIM_TIMEOUT seconds. Each wait on the
+# mail server gives up after EMAIL_TIMEOUT seconds, and fewer emails are
+# claimed at a time if a batch could take longer than its claim.
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_CLAIM_TIMEOUT = 60 * 5
+EMAIL_TIMEOUT = 10
+
 """
 This block of code allows users to login via username or email
 Also making sure that an email address is required to register
@@ -192,6 +205,50 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Deployed the cache is stored in the database so every gunicorn worker
+# shares the same catalogue version, the cache table is created by the
+# release command in the Procfile. In development a local memory cache
+# is used instead.
+if 'DATABASE_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'ur_gym_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/
+
+# The trolley, its summary and the toast messages are all stored in the
+# session. SESSION_STORE picks where sessions are kept:
+#   db         the database, the default
+#   cached_db  the cache, read from the database if not in the cache and
+#              written to both
+#   cache      only the cache, sessions are lost if the cache is cleared
+# Each engine only saves a session when its data has actually changed,
+# so browsing the shop does not write to the session store. For the
+# cache modes SESSION_CACHE_LOCATION can point at a memcached server to
+# keep sessions out of the database cache table altogether.
+SESSION_STORE = os.environ.get('SESSION_STORE', 'db')
+SESSION_ENGINE = f'ur_gym.sessions.{SESSION_STORE}'
+
+if 'SESSION_CACHE_LOCATION' in os.environ:
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION'),
+    }
+    SESSION_CACHE_ALIAS = 'sessions'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -266,6 +323,57 @@ if 'USE_AWS' in os.environ:
 FREE_DELIVERY_LIMIT = 50
 STANDARD_DELIVERY_PERCENTAGE = 10
 
+# Number of products shown on each page of the products page, this
+# is kept divisible by 2, 3 and 4 so every row of product cards is full
+PRODUCTS_PER_PAGE = 24
+
+# Number of seconds the category, price and rating counts and the
+# pages of products on the products page are cached for. Cached pages
+# are also rebuilt straight away whenever a product or category changes
+FACETS_CACHE_TIMEOUT = 60 * 60
+LISTING_CACHE_TIMEOUT = 60 * 60
+
+# Number of reviews shown on each page of reviews on the product details
+# page, and the number of seconds each page of reviews is cached for.
+# A product's cached reviews are rebuilt whenever one of them changes.
+REVIEWS_PER_PAGE = 10
+REVIEWS_CACHE_TIMEOUT = 60 * 60
+
+# Number of seconds the trolley total and product count of a logged in
+# user's trolley are cached for. They are worked out again whenever the
+# trolley changes, so this only limits how long an unused one is kept.
+TROLLEY_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of seconds the header trolley total and the trolley list toast
+# are cached for, they are cached again whenever the trolley changes
+TROLLEY_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Number of products each worker keeps in memory for the trolley,
+# checkout and webhook, the least recently used are dropped first
+PRODUCT_CACHE_SIZE = 1000
+
+# Stripe webhook events are handled by the process_webhook_events
+# command. A failed event is tried again after WEBHOOK_RETRY_DELAY
+# seconds, twice as long after each attempt, up to WEBHOOK_MAX_ATTEMPTS
+# times. An event claimed by a worker that stops is picked up again
+# after WEBHOOK_CLAIM_TIMEOUT seconds.
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_RETRY_DELAY = 60
+WEBHOOK_CLAIM_TIMEOUT = 60 * 5
+
+# Number of product names suggested while typing in the search box
+AUTOCOMPLETE_LIMIT = 8
+
+# Number of seconds between each check for a catalogue change by the
+# search suggestion and typo search indexes kept in memory. New and
+# renamed products are found by them after at most this many seconds.
+INDEX_VERSION_CHECK_INTERVAL = 5
+
+# How similar a word has to be to a searched word to be found by the typo
+# search, from 0 to 1, and the most products the typo search will show
+FUZZY_SEARCH_THRESHOLD = 0.3
+FUZZY_SEARCH_LIMIT = 100
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 